@@ -3,19 +3,29 @@ import re
 import os
 import logging
 import asyncio
+import hashlib
+import orjson
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Request, WebSocket
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi.websockets import WebSocketDisconnect
-from app.utils.transcript import get_transcript, get_manual_captions
-from app.utils.summarizer import generate_summary, generate_key_points, get_usage_metrics
+from app.utils import shared_cache
+from app.utils.transcript import get_transcript, fetch_transcript, split_segments
+from app.utils.summarizer import generate_summary, generate_key_points, get_usage_metrics, CACHE_TTL
 from app.utils.embed_store import store_embeddings
+from app.utils.storage import get_storage_stats, index_path
+from app.utils.resilience import get_resilience_metrics
+from app.utils.admission import get_admission_metrics
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+ANALYSIS_FIELDS = ("summary", "key_points", "language", "transcript")
+DEFAULT_SEGMENT_PAGE = 100
+MAX_SEGMENT_PAGE = 500
+
 class AnalyzeRequest(BaseModel):
     url: str
 
@@ -49,22 +59,22 @@ def get_video_id(url: str) -> str:
 async def process_video(video_id: str) -> dict:
     """Core video processing pipeline with enhanced error handling"""
     try:
-        # Get transcript with fallback to manual captions
+        # get_transcript already falls back to manual captions
         try:
-            transcript, language = get_transcript(video_id)
+            transcript, language = await asyncio.to_thread(get_transcript, video_id)
         except Exception as e:
-            logger.warning(f"Auto transcript failed, trying manual: {str(e)}")
-            transcript = get_manual_captions(video_id)
+            logger.warning(f"Transcript unavailable: {str(e)}")
+            transcript = None
             language = "en"
 
-        # Generate analysis components
-        summary = generate_summary(transcript)
-        key_points = generate_key_points(transcript) or ["Key points not available"]
+        # Generate analysis components off the event loop; the Gemini calls block
+        summary = await asyncio.to_thread(generate_summary, transcript)
+        key_points = await asyncio.to_thread(generate_key_points, transcript) or ["Key points not available"]
         
-        # Safe embedding storage
+        # Safe embedding storage (skipped when the index already exists)
         try:
-            if store_embeddings and callable(store_embeddings):
-                await store_embeddings(video_id, transcript)
+            if transcript and not os.path.exists(index_path(video_id)):
+                await asyncio.to_thread(store_embeddings, video_id, transcript)
         except Exception as e:
             logger.error(f"Embedding storage failed (non-critical): {str(e)}")
 
@@ -85,9 +95,43 @@ async def process_video(video_id: str) -> dict:
             status_code=500,
             detail=f"Video processing failed: {str(e)}"
         )
+def _parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Parse the comma-separated ``fields`` selector; all fields by default"""
+    if not fields:
+        return ANALYSIS_FIELDS
+    selected = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in selected if f not in ANALYSIS_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(ANALYSIS_FIELDS)}"
+        )
+    return selected
+
+def _content_etag(payload: dict) -> str:
+    """Weak validator: the same content is served br, gzip or identity encoded"""
+    digest = hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+def _json_response(content: dict, headers: Optional[dict] = None) -> Response:
+    """Serialize with orjson into a plain Response (FastAPI deprecated its orjson response class)"""
+    return Response(orjson.dumps(content), media_type="application/json", headers=headers)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses weak comparison (RFC 9110 13.1.2)
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
 @router.post("/analyze")
-async def analyze_video(request: Request, data: AnalyzeRequest):
-    """Main analysis endpoint with comprehensive validation"""
+async def analyze_video(request: Request, data: AnalyzeRequest, fields: Optional[str] = Query(None)):
+    """Main analysis endpoint with comprehensive validation.
+
+    ``fields`` selects analysis fields (e.g. ``summary,key_points``). Responses
+    carry a content-hash ETag; a matching ``If-None-Match`` gets a 304.
+    """
     try:
         logger.info(f"Analysis request received for: {data.url[:50]}...")
         
@@ -104,10 +148,29 @@ async def analyze_video(request: Request, data: AnalyzeRequest):
             )
             
         video_id = get_video_id(data.url)
+        selected = _parse_fields(fields)
+
+        # Repeat analyses can be answered without re-running the pipeline
+        etag_key = f"analysis_etag:{video_id}:{','.join(selected)}"
+        cached_etag = shared_cache.cache_peek(etag_key)
+        if cached_etag and _etag_matches(request, cached_etag):
+            logger.info(f"Analysis not modified for video: {video_id}")
+            return Response(status_code=304, headers={"ETag": cached_etag})
+
         response = await process_video(video_id)
+        analysis = response["analysis"]
+        complete = bool(analysis["transcript"]) and not analysis["summary"].startswith("Error") \
+            and analysis["key_points"] != ["Error generating key points."]
+        response["analysis"] = {k: v for k, v in analysis.items() if k in selected}
+
+        etag = _content_etag({"video_id": video_id, "analysis": response["analysis"]})
+        if complete:
+            shared_cache.cache_set(etag_key, etag, CACHE_TTL)
         
         logger.info(f"Successfully processed video: {video_id}")
-        return response
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return _json_response(response, headers={"ETag": etag})
         
     except HTTPException:
         raise
@@ -118,12 +181,45 @@ async def analyze_video(request: Request, data: AnalyzeRequest):
             detail="Internal server error"
         )
 
+@router.get("/transcript/{video_id}")
+async def get_transcript_page(
+    video_id: str,
+    start: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_SEGMENT_PAGE, ge=1, le=MAX_SEGMENT_PAGE)
+):
+    """Paginated transcript by segment range, for clients that omit it from /analyze"""
+    if not re.match(r'^[a-zA-Z0-9_-]{11}$', video_id):
+        raise HTTPException(status_code=400, detail="Invalid video ID format")
+    try:
+        transcript, language = await asyncio.to_thread(fetch_transcript, video_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    segments = split_segments(transcript)
+    end = min(start + limit, len(segments))
+    return _json_response({
+        "status": "success",
+        "video_id": video_id,
+        "language": language,
+        "start": start,
+        "end": end,
+        "total_segments": len(segments),
+        "next_start": end if end < len(segments) else None,
+        "segments": segments[start:end]
+    })
+
 @router.get("/usage")
 async def get_usage_stats():
     """API usage metrics endpoint"""
+    # Both read shared state (cache backend, storage lock); keep them off the event loop
+    metrics = await asyncio.to_thread(get_usage_metrics)
+    storage_stats = await asyncio.to_thread(get_storage_stats)
     return {
         "status": "success",
-        "metrics": get_usage_metrics(),
+        "metrics": metrics,
+        "storage": storage_stats,
+        "resilience": get_resilience_metrics(),
+        "admission": get_admission_metrics(),
         "server_time": datetime.now().isoformat()
     }
 
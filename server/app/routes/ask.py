@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Request, HTTPException
 from app.utils.qa import get_answer
+import asyncio
 import logging
 import traceback
 import re
@@ -56,8 +57,8 @@ async def ask_question(request: Request):
             
         logger.debug(f"Processing question for video {video_id}: {question[:50]}...")
         
-        # Get answer from QA system
-        answer = get_answer(video_id, question)
+        # Get answer from QA system (blocking retrieval and Gemini calls, so off the event loop)
+        answer = await asyncio.to_thread(get_answer, video_id, question)
         
         # Format response based on answer type
         if "Based on the video:" in answer and "Beyond the video:" in answer:
@@ -0,0 +1,39 @@
+# app/routes/debug.py
+import asyncio
+import logging
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Request, Response
+from app.utils.profiling import is_admin, list_profiles, get_profile
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def _require_admin(request: Request):
+    if not is_admin(request.headers.get("x-admin-token")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@router.get("/profiles")
+async def get_profiles(request: Request):
+    """Recent request profiles captured by any worker (newest first)"""
+    _require_admin(request)
+    return {
+        "status": "success",
+        "profiles": await asyncio.to_thread(list_profiles),
+        "server_time": datetime.now().isoformat()
+    }
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, request: Request):
+    """Download a profile: pstats (.prof) for cProfile, folded stacks for sampling"""
+    _require_admin(request)
+    profile = await asyncio.to_thread(get_profile, profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    extension = "prof" if profile["mode"] == "cprofile" else "folded"
+    media_type = "application/octet-stream" if extension == "prof" else "text/plain"
+    return Response(
+        content=profile["data"],
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.{extension}"'}
+    )
@@ -0,0 +1,183 @@
+#admission.py
+import math
+import time
+import asyncio
+import logging
+import itertools
+from typing import Dict, List, Optional
+from fastapi.responses import JSONResponse
+from app.utils.resilience import requested_deadline
+
+# Configuration
+TOTAL_CONCURRENCY = 8  # Pipelines running at once across all endpoints
+MAX_ACTIVE_PER_CLIENT = 4  # Running + queued requests before a client must wait its turn elsewhere
+EWMA_ALPHA = 0.2  # Weight of the latest request in the service time estimate
+
+logger = logging.getLogger(__name__)
+
+class EndpointClass:
+    """Admission settings and counters for one endpoint.
+
+    Lower ``priority`` is served first when slots free up.
+    """
+
+    def __init__(self, name: str, priority: int, limit: int, queue_limit: int,
+                 max_wait: float, service_time: float):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.service_time = service_time  # EWMA, seconds
+        self.inflight = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "client_limit": 0, "wait_estimate": 0, "timeout": 0}
+
+ENDPOINT_CLASSES: Dict[str, EndpointClass] = {
+    "/api/ask": EndpointClass("ask", priority=0, limit=8, queue_limit=32, max_wait=15, service_time=3),
+    "/api/analyze": EndpointClass("analyze", priority=1, limit=3, queue_limit=8, max_wait=60, service_time=20),
+}
+
+class _Waiter:
+    def __init__(self, cls: EndpointClass, client: str, seq: int):
+        self.cls = cls
+        self.client = client
+        self.seq = seq
+        self.future = asyncio.get_running_loop().create_future()
+
+# State tracking (per worker; the event loop serializes access)
+_waiters: List[_Waiter] = []
+_inflight_total = 0
+_client_active: Dict[str, int] = {}
+_seq = itertools.count()
+
+def _client_id(request) -> str:
+    # Only the last hop is appended by our proxy; earlier entries are client-supplied
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and forwarded.split(",")[-1].strip():
+        return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+def _has_capacity(cls: EndpointClass) -> bool:
+    return _inflight_total < TOTAL_CONCURRENCY and cls.inflight < cls.limit
+
+def _order(waiter: _Waiter):
+    # Priority first, then clients with fewer active requests, then arrival
+    return (waiter.cls.priority, _client_active.get(waiter.client, 0), waiter.seq)
+
+def _start(cls: EndpointClass):
+    global _inflight_total
+    _inflight_total += 1
+    cls.inflight += 1
+    cls.admitted += 1
+
+def _dispatch():
+    """Hand freed slots to the best eligible waiters."""
+    while True:
+        eligible = [w for w in _waiters if _has_capacity(w.cls)]
+        if not eligible:
+            return
+        waiter = min(eligible, key=_order)
+        _waiters.remove(waiter)
+        _start(waiter.cls)
+        waiter.future.set_result(True)
+
+def _estimated_wait(cls: EndpointClass) -> float:
+    ahead = sum(1 for w in _waiters if w.cls.priority <= cls.priority)
+    return (ahead + 1) * cls.service_time / cls.limit
+
+def _reject(cls: EndpointClass, reason: str, retry_after: float) -> JSONResponse:
+    cls.shed[reason] += 1
+    retry_after = max(1, math.ceil(retry_after))
+    logger.warning(f"Shedding {cls.name} request ({reason}), retry after {retry_after}s")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Server busy, please retry later"},
+        headers={"Retry-After": str(retry_after)}
+    )
+
+def _finish(cls: EndpointClass, client: str, admitted: bool, started: Optional[float] = None):
+    """Release a request's client count and, if it was admitted, its slot."""
+    global _inflight_total
+    _client_active[client] -= 1
+    if _client_active[client] <= 0:
+        del _client_active[client]
+    if admitted:
+        _inflight_total -= 1
+        cls.inflight -= 1
+    if started is not None:
+        elapsed = time.time() - started
+        cls.service_time = (1 - EWMA_ALPHA) * cls.service_time + EWMA_ALPHA * elapsed
+    _dispatch()
+
+async def admit_requests(request, call_next):
+    """HTTP middleware: per-endpoint concurrency, priority queueing and early 429s.
+
+    Stamps ``request.state.received_at`` so the request deadline can be
+    reduced by the time spent queued here.
+    """
+    request.state.received_at = time.time()
+    cls = ENDPOINT_CLASSES.get(request.url.path)
+    if cls is None or request.method == "OPTIONS":
+        return await call_next(request)
+
+    client = _client_id(request)
+    deadline = min(requested_deadline(request.headers.get("x-request-timeout")), cls.max_wait)
+
+    if not _has_capacity(cls) or any(w.cls.priority <= cls.priority for w in _waiters):
+        queued = sum(1 for w in _waiters if w.cls is cls)
+        estimate = _estimated_wait(cls)
+        if queued >= cls.queue_limit:
+            return _reject(cls, "queue_full", estimate)
+        if _client_active.get(client, 0) >= MAX_ACTIVE_PER_CLIENT:
+            return _reject(cls, "client_limit", estimate)
+        if estimate > deadline:
+            return _reject(cls, "wait_estimate", estimate)
+
+        waiter = _Waiter(cls, client, next(_seq))
+        _waiters.append(waiter)
+        _client_active[client] = _client_active.get(client, 0) + 1
+        _dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=deadline)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Admitted at the last moment; give the slot back
+                _finish(cls, client, admitted=True)
+            else:
+                _waiters.remove(waiter)
+                _finish(cls, client, admitted=False)
+            return _reject(cls, "timeout", cls.service_time)
+        except asyncio.CancelledError:
+            admitted = waiter not in _waiters
+            if not admitted:
+                _waiters.remove(waiter)
+            _finish(cls, client, admitted=admitted)
+            raise
+    else:
+        _start(cls)
+        _client_active[client] = _client_active.get(client, 0) + 1
+
+    started = time.time()
+    try:
+        return await call_next(request)
+    finally:
+        _finish(cls, client, admitted=True, started=started)
+
+def get_admission_metrics() -> Dict:
+    """Return queue depth, in-flight and shed counts per endpoint."""
+    return {
+        "inflight_total": _inflight_total,
+        "concurrency_limit": TOTAL_CONCURRENCY,
+        "endpoints": {
+            cls.name: {
+                "inflight": cls.inflight,
+                "queue_depth": sum(1 for w in _waiters if w.cls is cls),
+                "limit": cls.limit,
+                "admitted": cls.admitted,
+                "avg_service_time": round(cls.service_time, 3),
+                "shed": dict(cls.shed),
+            }
+            for cls in ENDPOINT_CLASSES.values()
+        },
+    }
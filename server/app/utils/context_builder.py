@@ -0,0 +1,123 @@
+#context_builder.py
+from __future__ import annotations
+import re
+import logging
+from typing import TYPE_CHECKING, List, Tuple
+
+if TYPE_CHECKING:
+    # Only for annotations; documents come from the vector store
+    from langchain.schema import Document
+
+# Configuration
+CONTEXT_TOKEN_BUDGET = 1500  # Max tokens of transcript stuffed into the prompt
+FETCH_K = 12  # Candidates pulled from the vector store before re-ranking
+MIN_K = 2
+MMR_LAMBDA = 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
+DUPLICATE_THRESHOLD = 0.8  # Jaccard similarity above which a chunk is a near-duplicate
+CHARS_PER_TOKEN = 4  # Rough estimate for Gemini tokenization
+MIN_OVERLAP = 20  # Shorter suffix/prefix matches are coincidence, not splitter overlap
+
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough for budgeting and logging."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _adaptive_cut(scored: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+    """Keep candidates above the largest drop in relevance score."""
+    if len(scored) <= MIN_K:
+        return scored
+    gaps = [scored[i][1] - scored[i + 1][1] for i in range(MIN_K - 1, len(scored) - 1)]
+    cut = gaps.index(max(gaps)) + MIN_K
+    return scored[:cut]
+
+def _mmr(scored: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+    """Greedy maximal marginal relevance ordering, dropping near-duplicates."""
+    remaining = [(doc, score, _shingles(doc.page_content)) for doc, score in scored]
+    selected = []
+    while remaining:
+        best, best_value = None, None
+        for candidate in remaining:
+            redundancy = max((_jaccard(candidate[2], s[2]) for s in selected), default=0.0)
+            value = MMR_LAMBDA * candidate[1] - (1 - MMR_LAMBDA) * redundancy
+            if best_value is None or value > best_value:
+                best, best_value = candidate, value
+        remaining.remove(best)
+        if any(_jaccard(best[2], s[2]) > DUPLICATE_THRESHOLD for s in selected):
+            continue
+        selected.append(best)
+    return [(doc, score) for doc, score, _ in selected]
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``.
+
+    Matches shorter than MIN_OVERLAP count as no overlap.
+    """
+    for size in range(min(len(left), len(right)), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+def _merge_adjacent(docs: List[Document]) -> List[str]:
+    """Join chunks that are neighbours in the transcript, keeping the overlap once."""
+    indexed = [d for d in docs if d.metadata.get("chunk") is not None]
+    others = [d.page_content for d in docs if d.metadata.get("chunk") is None]
+    indexed.sort(key=lambda d: d.metadata["chunk"])
+
+    passages, last_chunk = [], None
+    for doc in indexed:
+        text = doc.page_content
+        if passages and doc.metadata["chunk"] == last_chunk + 1:
+            overlap = _overlap(passages[-1], text)
+            passages[-1] += text[overlap:] if overlap else " " + text
+        else:
+            passages.append(text)
+        last_chunk = doc.metadata["chunk"]
+    return passages + others
+
+def build_context(
+    vectorstore,
+    question: str,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    fetch_k: int = FETCH_K,
+) -> Tuple[str, dict]:
+    """Assemble transcript context for a question within a token budget.
+
+    Returns the context string and stats for logging.
+    """
+    scored = vectorstore.similarity_search_with_relevance_scores(question, k=fetch_k)
+    candidate_tokens = sum(estimate_tokens(doc.page_content) for doc, _ in scored)
+
+    ranked = _mmr(_adaptive_cut(scored))
+
+    chosen, used = [], 0
+    for doc, _ in ranked:
+        tokens = estimate_tokens(doc.page_content)
+        if chosen and used + tokens > token_budget:
+            continue
+        if not chosen and tokens > token_budget:
+            doc = type(doc)(
+                page_content=doc.page_content[:token_budget * CHARS_PER_TOKEN],
+                metadata=doc.metadata
+            )
+            tokens = token_budget
+        chosen.append(doc)
+        used += tokens
+
+    context = "\n\n".join(_merge_adjacent(chosen))
+    stats = {
+        "candidates": len(scored),
+        "chunks_used": len(chosen),
+        "candidate_tokens": candidate_tokens,
+        "context_tokens": estimate_tokens(context),
+    }
+    return context, stats
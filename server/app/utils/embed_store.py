@@ -4,28 +4,38 @@ from langchain_community.vectorstores import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+from app.utils import storage, resilience
+from app.utils.summarizer import reserve_gemini_slot
 import logging
 
 MAX_TRANSCRIPT_LENGTH = 100000  # ~100k characters
+EMBEDDING_MODEL = "models/embedding-001"
 
-def store_embeddings(video_id: str, transcript: str):
+def store_embeddings(video_id: str, transcript: str, rebuilt: bool = False):
     try:
         if not video_id or len(video_id) > 100:
             raise ValueError("Invalid video ID")
         if not transcript or len(transcript) > MAX_TRANSCRIPT_LENGTH:
             raise ValueError("Transcript too long or empty")
             
-        documents = [Document(page_content=chunk) for chunk in RecursiveCharacterTextSplitter(
-            chunk_size=500, chunk_overlap=100).split_text(transcript)]
+        # Chunk positions let the context builder merge neighbouring chunks
+        documents = [Document(page_content=chunk, metadata={"chunk": i}) for i, chunk in enumerate(
+            RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100).split_text(transcript))]
 
+        # Embedding requests count against the same Gemini quota as generation.
+        # Fails fast instead of sleeping past the request's deadline.
+        resilience.wait_for_slot(f"gemini:{EMBEDDING_MODEL}", reserve_gemini_slot)
+
+        storage.refresh_chroma_client(video_id)
         Chroma.from_documents(
             documents=documents,
             embedding=GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001",
+                model=EMBEDDING_MODEL,
                 google_api_key=os.getenv("GEMINI_API_KEY")
             ),
-            persist_directory=f"chroma_db/{video_id}"
+            persist_directory=storage.index_path(video_id)
         )
+        storage.record_write(video_id, rebuilt=rebuilt)
     except Exception as e:
         logging.error(f"Failed to store embeddings: {str(e)}")
         raise
@@ -0,0 +1,225 @@
+#profiling.py
+import os
+import re
+import sys
+import hmac
+import json
+import time
+import uuid
+import asyncio
+import random
+import marshal
+import cProfile
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Configuration
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Share of requests auto-profiled
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", "10"))  # Keep auto profiles above this
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+MAX_PROFILES = 20
+# Shared by every uvicorn worker, so any worker can serve any X-Profile-Id
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("logs", "profiles"))
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+
+# Only stacks passing through the server's own code are recorded, so idle
+# pool threads and the event loop waiting on I/O don't drown out the request
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger(__name__)
+
+_profiles_lock = threading.Lock()
+
+# Held by the running StackSampler; samplers see the whole process, so a
+# second one would only duplicate the first one's stacks
+_sampler_lock = threading.Lock()
+
+def is_admin(token: Optional[str]) -> bool:
+    """Admin features are disabled unless ADMIN_TOKEN is set."""
+    # Compare bytes: compare_digest rejects non-ASCII str, and headers arrive latin-1 decoded
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+class StackSampler:
+    """Samples every thread's stack on an interval and aggregates collapsed stacks.
+
+    Output is the folded format used by flamegraph.pl and speedscope:
+    ``thread;outer;...;inner count`` per line.
+
+    The request's work runs on shared pool threads, so samples cannot be
+    attributed to one request: a profile also contains whatever concurrent
+    requests were doing. Profile an otherwise idle worker for clean results.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                in_app = False
+                while frame is not None:
+                    code = frame.f_code
+                    in_app = in_app or (code.co_filename.startswith(APP_ROOT)
+                                        and "site-packages" not in code.co_filename)
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if in_app:
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def render(self) -> bytes:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common()).encode()
+
+class RequestProfiler:
+    """Profiles one request with either the stack sampler or cProfile.
+
+    cProfile only sees the event loop thread and cannot nest, so it falls
+    back to sampling when another profile is already running there.
+    """
+
+    def __init__(self, mode: str = "sample"):
+        self.mode = mode
+
+    def start(self) -> bool:
+        """Start profiling; False if the profiler needed is already in use."""
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+                return True
+            except ValueError:
+                logger.warning("cProfile already active, sampling instead")
+                self.mode = "sample"
+        if not _sampler_lock.acquire(blocking=False):
+            return False
+        self._profiler = StackSampler()
+        self._profiler.start()
+        return True
+
+    def stop(self) -> bytes:
+        if self.mode == "cprofile":
+            self._profiler.disable()
+            # Same bytes as `python -m cProfile -o`; load with pstats or snakeviz
+            self._profiler.create_stats()
+            return marshal.dumps(self._profiler.stats)
+        try:
+            self._profiler.stop()
+        finally:
+            _sampler_lock.release()
+        return self._profiler.render()
+
+def should_auto_profile() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _read_meta(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def record_profile(method: str, path: str, duration: float, mode: str, trigger: str, data: bytes) -> str:
+    """Store a profile in PROFILE_DIR, keeping the newest MAX_PROFILES."""
+    profile_id = uuid.uuid4().hex[:12]
+    meta = {
+        "id": profile_id,
+        "method": method,
+        "path": path,
+        "duration": round(duration, 3),
+        "mode": mode,
+        "trigger": trigger,
+        "created_at": time.time(),
+        "size": len(data),
+    }
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    # Data first: a profile is listed only once its metadata exists
+    _write_atomic(os.path.join(PROFILE_DIR, f"{profile_id}.data"), data)
+    _write_atomic(os.path.join(PROFILE_DIR, f"{profile_id}.json"), json.dumps(meta).encode())
+    with _profiles_lock:
+        for old in list_profiles()[MAX_PROFILES:]:
+            for ext in ("json", "data"):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, f"{old['id']}.{ext}"))
+                except FileNotFoundError:
+                    pass
+    logger.info(f"Captured {mode} profile {profile_id} for {method} {path} ({duration:.2f}s, {trigger})")
+    return profile_id
+
+def list_profiles() -> List[Dict]:
+    """Metadata of stored profiles from all workers, newest first."""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    profiles = [_read_meta(os.path.join(PROFILE_DIR, name)) for name in names if name.endswith(".json")]
+    return sorted((p for p in profiles if p), key=lambda p: p["created_at"], reverse=True)
+
+def get_profile(profile_id: str) -> Optional[Dict]:
+    """Metadata plus ``data`` bytes, or None if unknown or already pruned."""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    meta = _read_meta(os.path.join(PROFILE_DIR, f"{profile_id}.json"))
+    if meta is None:
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.data"), "rb") as f:
+            return {**meta, "data": f.read()}
+    except FileNotFoundError:
+        return None
+
+async def profile_requests(request, call_next):
+    """HTTP middleware: on-demand (admin) and slow-request auto profiling."""
+    requested = request.headers.get("x-profile") or request.query_params.get("profile")
+    mode, trigger = None, None
+    if requested and is_admin(request.headers.get("x-admin-token")):
+        mode = "cprofile" if requested == "cprofile" else "sample"
+        trigger = "requested"
+    elif should_auto_profile():
+        mode, trigger = "sample", "slow"
+
+    if mode is None:
+        return await call_next(request)
+
+    profiler = RequestProfiler(mode)
+    if not profiler.start():
+        if trigger == "requested":
+            logger.warning(f"Profiler busy, serving {request.method} {request.url.path} unprofiled")
+        return await call_next(request)
+    start = time.time()
+    try:
+        response = await call_next(request)
+    finally:
+        data = profiler.stop()
+    duration = time.time() - start
+
+    if trigger == "requested" or duration >= PROFILE_SLOW_SECONDS:
+        profile_id = await asyncio.to_thread(
+            record_profile, request.method, request.url.path, duration, profiler.mode, trigger, data
+        )
+        if trigger == "requested":
+            response.headers["X-Profile-Id"] = profile_id
+    return response
@@ -1,15 +1,46 @@
 from typing import Optional
 import os
 import logging
-from langchain.chains import RetrievalQA
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_community.vectorstores import Chroma
+from app.utils import storage, resilience
+from app.utils.embed_store import store_embeddings
+from app.utils.summarizer import MODEL_NAME
+from app.utils.context_builder import build_context, estimate_tokens
 
 MAX_QUESTION_LENGTH = 500
+UPSTREAM = f"gemini:{MODEL_NAME}"
 
 logger = logging.getLogger(__name__)
 
+def _retrieve_context(video_id: str, question: str):
+    """Build the transcript context, rebuilding the index if it is missing.
+
+    The index stays pinned from the existence check until retrieval is
+    done, so storage GC cannot delete it underneath us.
+    """
+    # Setup embeddings and Chroma for transcript-based retrieval
+    embedding_function = GoogleGenerativeAIEmbeddings(
+        model="models/embedding-001",
+        google_api_key=os.getenv("GEMINI_API_KEY")
+    )
+    with storage.using(video_id) as chroma_path:
+        if not os.path.exists(chroma_path):
+            # Never indexed, or evicted by storage GC: rebuild transparently
+            from app.utils.transcript import get_transcript
+            transcript, _ = get_transcript(video_id)
+            if not transcript:
+                return None
+            store_embeddings(video_id, transcript, rebuilt=True)
+
+        storage.refresh_chroma_client(video_id)
+        vectorstore = Chroma(
+            persist_directory=chroma_path,
+            embedding_function=embedding_function
+        )
+        return build_context(vectorstore, question)
+
 def get_answer(video_id: str, question: str) -> Optional[str]:
     """
     Answers a user question using:
@@ -32,7 +63,7 @@ def get_answer(video_id: str, question: str) -> Optional[str]:
 
         # Initialize LLM (used in all modes)
         llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-lite",
+            model=MODEL_NAME,
             google_api_key=os.getenv("GEMINI_API_KEY"),
             temperature=0.3
         )
@@ -43,11 +74,11 @@ def get_answer(video_id: str, question: str) -> Optional[str]:
         if "buddy" in question.lower():
             try:
                 logger.info("Buddy Mode activated (no transcript)")
-                response = llm.invoke(
+                response = resilience.call(UPSTREAM, lambda: llm.invoke(
                     f"You are Buddy Mode AI. Ignore any video transcript. "
                     f"Answer naturally using your general knowledge only.\n\n"
                     f"User Question: {question}"
-                )
+                ))
                 return f"Answer: {response.content.strip()}"
             except Exception as e:
                 logger.error(f"Buddy mode error: {str(e)}", exc_info=True)
@@ -56,29 +87,6 @@ def get_answer(video_id: str, question: str) -> Optional[str]:
         # --------------------------
         # 2) DEFAULT + BEYOND MODES (transcript-based answers)
         # --------------------------
-        # Setup embeddings and Chroma for transcript-based retrieval
-        embedding_function = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=os.getenv("GEMINI_API_KEY")
-        )
-        chroma_path = f"chroma_db/{video_id}"
-
-        if not os.path.exists(chroma_path):
-            from app.utils.transcript import get_transcript
-            transcript = get_transcript(video_id)
-            if not transcript:
-                return "No transcript available for this video"
-            Chroma.from_texts(
-                [transcript],
-                embedding=embedding_function,
-                persist_directory=chroma_path
-            )
-
-        vectorstore = Chroma(
-            persist_directory=chroma_path,
-            embedding_function=embedding_function
-        )
-
         # Prompt template for transcript-based QA
         prompt_template = """
 # GOAL
@@ -102,20 +110,27 @@ FINAL ANSWER:
 """
         prompt = ChatPromptTemplate.from_template(prompt_template)
 
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=vectorstore.as_retriever(),
-            chain_type_kwargs={"prompt": prompt, "document_variable_name": "context"}
-        )
+        qa_chain = prompt | llm
 
         # --------------------------
         # Run transcript-based QA
         # --------------------------
         logger.info(f"Processing question: {question[:50]}...")
         try:
-            result = qa_chain.invoke({"query": question})
-            transcript_answer = result.get("result", "").strip()
+            retrieved = _retrieve_context(video_id, question)
+            if retrieved is None:
+                return "No transcript available for this video"
+            context, context_stats = retrieved
+            prompt_tokens = estimate_tokens(prompt.format(context=context, question=question))
+            logger.info(
+                f"Prompt tokens for {video_id}: {prompt_tokens} "
+                f"(context {context_stats['context_tokens']} from {context_stats['chunks_used']}"
+                f"/{context_stats['candidates']} chunks, {context_stats['candidate_tokens']} before budgeting)"
+            )
+            result = resilience.call(
+                UPSTREAM, lambda: qa_chain.invoke({"context": context, "question": question})
+            )
+            transcript_answer = result.content.strip()
 
             if not transcript_answer:
                 transcript_answer = "The transcript does not contain an answer to this question."
@@ -129,9 +144,9 @@ FINAL ANSWER:
                    "i don't know" in transcript_answer.lower() or \
                    "i'm not sure" in transcript_answer.lower():
                     try:
-                        general_resp = llm.invoke(
+                        general_resp = resilience.call(UPSTREAM, lambda: llm.invoke(
                             f"Provide a helpful, factual answer using only general knowledge for this question: {question}"
-                        )
+                        ))
                         general_answer = general_resp.content.strip()
                         return f"Based on the video: {transcript_answer}\n\nBeyond the video: {general_answer}"
                     except Exception as e:
@@ -0,0 +1,297 @@
+#resilience.py
+import math
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, TypeVar
+
+# Configuration
+DEFAULT_DEADLINE = 60  # seconds, when the request does not set one
+MIN_DEADLINE = 5  # seconds; shorter client-requested deadlines are raised to this
+UPSTREAM_TIMEOUT = 30  # seconds; only calls slower than this count against the upstream
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+DECREASE_FACTOR = 0.5  # Multiplicative decrease on overload
+FAILURE_THRESHOLD = 5  # Consecutive failures that open the breaker
+OPEN_COOLDOWN = 30  # seconds before a half-open probe is allowed
+HALF_OPEN_PROBES = 1
+RETRY_BASE_DELAY = 1  # seconds, doubled per attempt
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class ResilienceError(Exception):
+    """Base class for calls rejected by the resilience layer."""
+
+class CircuitOpenError(ResilienceError):
+    """Upstream is failing; the call was not attempted."""
+
+class OverloadedError(ResilienceError):
+    """No concurrency slot became free before the deadline."""
+
+class DeadlineExceededError(ResilienceError):
+    """The request's deadline ran out before the call completed."""
+
+class RateLimitedError(ResilienceError):
+    """Our own rate limiter would not allow the call before the deadline."""
+
+class UpstreamTimeoutError(ResilienceError):
+    """The upstream took longer than UPSTREAM_TIMEOUT to answer."""
+
+# Absolute epoch deadline of the current request, propagated to worker threads
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Set the deadline for everything called within the block."""
+    token = _deadline.set(time.time() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def requested_deadline(value: Optional[str]) -> float:
+    """Parse a client's X-Request-Timeout into [MIN_DEADLINE, DEFAULT_DEADLINE] seconds."""
+    try:
+        seconds = float(value) if value is not None else DEFAULT_DEADLINE
+    except ValueError:
+        return DEFAULT_DEADLINE
+    if not math.isfinite(seconds):
+        return DEFAULT_DEADLINE
+    return min(max(seconds, MIN_DEADLINE), DEFAULT_DEADLINE)
+
+def remaining() -> float:
+    """Seconds left before the current deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return DEFAULT_DEADLINE
+    return deadline - time.time()
+
+def is_overload(error: Exception) -> bool:
+    """Errors that mean upstream is saturated rather than the request being bad."""
+    if isinstance(error, (DeadlineExceededError, TimeoutError, FutureTimeout)):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in ("quota", "429", "503", "resource exhausted", "unavailable", "deadline"))
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: +1 per window of successes, halved on overload."""
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, minimum: int = MIN_CONCURRENCY,
+                 maximum: int = MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.inflight = 0
+        self.shed = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        end = time.time() + max(timeout, 0)
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                left = end - time.time()
+                if left <= 0:
+                    self.shed += 1
+                    return False
+                self._cond.wait(left)
+            self.inflight += 1
+            return True
+
+    def release(self, overloaded: bool = False):
+        with self._cond:
+            self.inflight -= 1
+            if overloaded:
+                self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / max(self.limit, 1))
+            self._cond.notify_all()
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probes after a cooldown."""
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, cooldown: float = OPEN_COOLDOWN,
+                 probes: int = HALF_OPEN_PROBES, clock: Callable[[], float] = time.time):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.probes = probes
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._probes_inflight = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if self.clock() - self.opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = "half_open"
+                self._probes_inflight = 0
+            if self.state == "half_open":
+                if self._probes_inflight >= self.probes:
+                    self.rejected += 1
+                    return False
+                self._probes_inflight += 1
+            return True
+
+    def cancel(self):
+        """Give back a half-open probe slot for a call that was never made."""
+        with self._lock:
+            if self.state == "half_open" and self._probes_inflight > 0:
+                self._probes_inflight -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state == "half_open":
+                logger.info("Circuit closed after successful probe")
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    self.trips += 1
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = self.clock()
+
+class Upstream:
+    """Limiter, breaker and counters guarding one upstream model."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.limiter = AdaptiveLimiter()
+        self.breaker = CircuitBreaker()
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0, "retries": 0,
+                      "rate_limited": 0, "abandoned": 0}
+
+    def metrics(self) -> Dict:
+        return {
+            "state": self.breaker.state,
+            "concurrency_limit": int(self.limiter.limit),
+            "inflight": self.limiter.inflight,
+            "trips": self.breaker.trips,
+            "rejected_open": self.breaker.rejected,
+            "shed": self.limiter.shed,
+            **self.stats,
+        }
+
+_upstreams: Dict[str, Upstream] = {}
+_upstreams_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY * 2, thread_name_prefix="upstream")
+
+def get_upstream(name: str) -> Upstream:
+    with _upstreams_lock:
+        if name not in _upstreams:
+            _upstreams[name] = Upstream(name)
+        return _upstreams[name]
+
+def _attempt(upstream: Upstream, fn: Callable[[], T]) -> T:
+    budget = remaining()
+    if budget <= 0:
+        raise DeadlineExceededError(f"Deadline exceeded before calling {upstream.name}")
+    if not upstream.breaker.allow():
+        raise CircuitOpenError(f"{upstream.name} circuit open")
+    if not upstream.limiter.acquire(budget):
+        upstream.breaker.cancel()
+        raise OverloadedError(f"{upstream.name} concurrency limit reached")
+
+    upstream.stats["calls"] += 1
+    started = time.time()
+    future = _executor.submit(contextvars.copy_context().run, fn)
+    abandoned = []
+
+    def _done(f):
+        # Judged by how the upstream actually behaved, never by the caller's
+        # deadline: clients choose their deadline, so it must not trip anything
+        error = f.exception()
+        slow = time.time() - started >= UPSTREAM_TIMEOUT
+        upstream.limiter.release(overloaded=slow or (error is not None and is_overload(error)))
+        if abandoned:
+            if error is None and not slow:
+                upstream.breaker.record_success()
+            else:
+                upstream.breaker.record_failure()
+    future.add_done_callback(_done)
+
+    wait = min(remaining(), UPSTREAM_TIMEOUT)
+    try:
+        result = future.result(timeout=wait)
+    except FutureTimeout:
+        # The call keeps its slot until it actually returns
+        if wait >= UPSTREAM_TIMEOUT:
+            upstream.stats["timeouts"] += 1
+            upstream.breaker.record_failure()
+            raise UpstreamTimeoutError(f"{upstream.name} did not answer within {UPSTREAM_TIMEOUT}s")
+        # Our caller ran out of time; the breaker hears the outcome when the call returns
+        abandoned.append(True)
+        upstream.stats["abandoned"] += 1
+        raise DeadlineExceededError(f"{upstream.name} call exceeded the request deadline")
+    except Exception:
+        upstream.stats["failures"] += 1
+        upstream.breaker.record_failure()
+        raise
+    upstream.stats["successes"] += 1
+    upstream.breaker.record_success()
+    return result
+
+def _wait_for_slot(upstream: Upstream, rate_limit: Callable[[float], Optional[float]]):
+    """Reserve a rate-limit slot that starts before the deadline and sleep until it."""
+    slot = rate_limit(max(remaining(), 0))
+    if slot is None:
+        upstream.stats["rate_limited"] += 1
+        raise RateLimitedError(f"No {upstream.name} rate limit slot before the deadline")
+    wait_time = slot - time.time()
+    if wait_time > 0:
+        time.sleep(wait_time)
+
+def wait_for_slot(name: str, rate_limit: Callable[[float], Optional[float]]):
+    """Deadline-aware rate limiting for calls made outside ``call``.
+
+    Raises RateLimitedError instead of sleeping past the deadline.
+    """
+    _wait_for_slot(get_upstream(name), rate_limit)
+
+def call(name: str, fn: Callable[[], T], retries: int = 2,
+         rate_limit: Optional[Callable[[float], Optional[float]]] = None) -> T:
+    """Call ``fn`` through the named upstream's breaker and limiter.
+
+    ``rate_limit(max_wait)`` reserves a slot starting within ``max_wait``
+    seconds and returns its epoch time, or None without reserving. The wait
+    happens before each attempt, so it holds no concurrency slot and never
+    counts as an upstream failure. Transient failures are retried with
+    exponential backoff while the deadline allows; quota errors and
+    rejections are raised immediately.
+    """
+    upstream = get_upstream(name)
+    for attempt in range(retries + 1):
+        try:
+            if rate_limit is not None:
+                _wait_for_slot(upstream, rate_limit)
+            return _attempt(upstream, fn)
+        except ResilienceError:
+            raise
+        except Exception as e:
+            delay = RETRY_BASE_DELAY * 2 ** attempt
+            if attempt == retries or 'quota' in str(e).lower() or delay >= remaining():
+                raise
+            upstream.stats["retries"] += 1
+            logger.warning(f"Retry {attempt + 1}/{retries} for {name} - Waiting {delay}s")
+            time.sleep(delay)
+
+def get_resilience_metrics() -> Dict:
+    """Return breaker and limiter state per upstream."""
+    with _upstreams_lock:
+        return {name: upstream.metrics() for name, upstream in _upstreams.items()}
@@ -0,0 +1,381 @@
+#shared_cache.py
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Configuration
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")  # sqlite | redis | memory
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache/shared_cache.sqlite3")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+KEY_PREFIX = "ytbuddy:"
+
+# Identifies the process that wrote an entry, so hits served from another
+# worker's work can be counted separately
+WORKER_ID = os.getpid()
+
+logger = logging.getLogger(__name__)
+
+class CacheBackend:
+    """Key/value state shared between uvicorn workers.
+
+    Values must be JSON serializable. ``ttl`` is in seconds; None means no expiry.
+    """
+    name = "base"
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, int]]:
+        """Return (value, writer worker id) or None if missing/expired."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        raise NotImplementedError
+
+    def read_counter(self, key: str) -> int:
+        """Current value of a counter; a plain read, no write lock taken."""
+        raise NotImplementedError
+
+    def reserve_slot(self, key: str, interval: float, max_wait: Optional[float] = None) -> Optional[float]:
+        """Atomically claim the next time slot at least ``interval`` after the last one.
+
+        Returns the epoch time at which the caller may proceed, or None
+        without claiming anything if that is more than ``max_wait`` away.
+        """
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Drop expired entries; backends with native expiry need not override."""
+        return 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+class MemoryBackend(CacheBackend):
+    """Per-process fallback; nothing is shared between workers."""
+    name = "memory"
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, int, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get_entry(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if not item:
+                return None
+            value, writer, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            return value, writer
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, WORKER_ID, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value = (self._data.get(key, (0,))[0] or 0) + amount
+            self._data[key] = (value, WORKER_ID, None)
+            return value
+
+    def read_counter(self, key):
+        with self._lock:
+            return int(self._data.get(key, (0,))[0] or 0)
+
+    def reserve_slot(self, key, interval, max_wait=None):
+        with self._lock:
+            last = self._data.get(key, (0,))[0] or 0
+            now = time.time()
+            slot = max(now, last + interval)
+            if max_wait is not None and slot - now > max_wait:
+                return None
+            self._data[key] = (slot, WORKER_ID, None)
+            return slot
+
+class SQLiteBackend(CacheBackend):
+    """Shared state in a local SQLite file; works across workers on one host."""
+    name = "sqlite"
+
+    def __init__(self, path: str = CACHE_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "key TEXT PRIMARY KEY, value, expires_at REAL, writer INTEGER)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _decode(value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    def get_entry(self, key):
+        row = self._conn().execute(
+            "SELECT value, writer FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        return (self._decode(row[0]), row[1]) if row else None
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at, writer) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl else None, WORKER_ID)
+        )
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key, amount=1):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO kv (key, value, expires_at, writer) VALUES (?, ?, NULL, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value",
+                (key, amount, WORKER_ID)
+            )
+            value = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return int(value)
+
+    def read_counter(self, key):
+        row = self._conn().execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def reserve_slot(self, key, interval, max_wait=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            last = float(row[0]) if row else 0
+            now = time.time()
+            slot = max(now, last + interval)
+            if max_wait is not None and slot - now > max_wait:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at, writer) VALUES (?, ?, NULL, ?)",
+                (key, slot, WORKER_ID)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return slot
+
+    def purge_expired(self) -> int:
+        cursor = self._conn().execute(
+            "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        return cursor.rowcount
+
+class RedisBackend(CacheBackend):
+    """Shared state in Redis for multi-host deployments.
+
+    Pass ``client`` to use an existing redis-py compatible client
+    (e.g. a local fakeredis stand-in) instead of connecting to REDIS_URL.
+    """
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL, client=None):
+        if client is None:
+            import redis  # Optional dependency
+            client = redis.Redis.from_url(url)
+        # from_url() connects lazily; fail here so _create_backend can fall back
+        client.ping()
+        self.client = client
+
+    def get_entry(self, key):
+        raw = self.client.get(KEY_PREFIX + key)
+        if raw is None:
+            return None
+        item = json.loads(raw)
+        return item["v"], item["w"]
+
+    def set(self, key, value, ttl=None):
+        payload = json.dumps({"v": value, "w": WORKER_ID})
+        if ttl:
+            self.client.set(KEY_PREFIX + key, payload, px=int(ttl * 1000))
+        else:
+            self.client.set(KEY_PREFIX + key, payload)
+
+    def delete(self, key):
+        self.client.delete(KEY_PREFIX + key)
+
+    def incr(self, key, amount=1):
+        # Counters are stored as plain integers so INCRBY stays atomic
+        return int(self.client.incrby(KEY_PREFIX + "counter:" + key, amount))
+
+    def read_counter(self, key):
+        return int(self.client.get(KEY_PREFIX + "counter:" + key) or 0)
+
+    def reserve_slot(self, key, interval, max_wait=None):
+        redis_key = KEY_PREFIX + "slot:" + key
+        claimed = []
+
+        def _claim(pipe):
+            last = float(pipe.get(redis_key) or 0)
+            now = time.time()
+            slot = max(now, last + interval)
+            if max_wait is not None and slot - now > max_wait:
+                claimed[:] = [None]
+                return
+            pipe.multi()
+            pipe.set(redis_key, repr(slot))
+            claimed[:] = [slot]
+
+        self.client.transaction(_claim, redis_key)
+        return claimed[0]
+
+_backend: Optional[CacheBackend] = None
+_backend_lock = threading.Lock()
+
+# Keeps rate limiting and counters working in this process while the shared
+# backend is unreachable
+_local_fallback = MemoryBackend()
+
+def _create_backend() -> CacheBackend:
+    if CACHE_BACKEND == "redis":
+        try:
+            return RedisBackend(REDIS_URL)
+        except Exception as e:
+            logger.warning(f"Redis cache unavailable, falling back to SQLite: {str(e)}")
+    if CACHE_BACKEND in ("sqlite", "redis"):
+        try:
+            return SQLiteBackend(CACHE_DB_PATH)
+        except Exception as e:
+            logger.warning(f"SQLite cache unavailable, falling back to memory: {str(e)}")
+    return MemoryBackend()
+
+def get_backend() -> CacheBackend:
+    """Return the process-wide backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+                logger.info(f"Using {_backend.name} shared cache backend")
+    return _backend
+
+def set_backend(backend: CacheBackend):
+    """Replace the backend (e.g. with a stand-in)."""
+    global _backend
+    _backend = backend
+
+def cache_get(key: str) -> Optional[Any]:
+    """Look up a cached value and record hit/miss counters in the shared store.
+
+    Each lookup costs one counter write; a failed metric update never hides
+    the value that was found. Use ``cache_peek`` for probes that usually
+    miss (negative caches, validators) so they don't skew the hit rate.
+    """
+    backend = get_backend()
+    try:
+        entry = backend.get_entry(key)
+    except Exception as e:
+        logger.error(f"Shared cache read failed for {key}: {str(e)}")
+        return None
+
+    if entry is None:
+        metric = "cache_misses"
+    elif entry[1] != WORKER_ID:
+        metric = "cache_cross_worker_hits"
+    else:
+        metric = "cache_local_hits"
+    try:
+        backend.incr(metric)
+    except Exception as e:
+        logger.warning(f"Cache metric update failed for {metric}: {str(e)}")
+    return entry[0] if entry else None
+
+def cache_peek(key: str) -> Optional[Any]:
+    """Unmetered lookup; None if missing or the backend is unavailable."""
+    try:
+        return get_backend().get(key)
+    except Exception as e:
+        logger.error(f"Shared cache read failed for {key}: {str(e)}")
+        return None
+
+def cache_set(key: str, value: Any, ttl: Optional[float] = None):
+    try:
+        get_backend().set(key, value, ttl)
+    except Exception as e:
+        logger.error(f"Shared cache write failed for {key}: {str(e)}")
+
+def incr(key: str, amount: int = 1) -> int:
+    try:
+        return get_backend().incr(key, amount)
+    except Exception as e:
+        logger.error(f"Shared counter update failed for {key}: {str(e)}")
+        return _local_fallback.incr(key, amount)
+
+def counter(key: str) -> int:
+    """Current value of a counter without changing it."""
+    try:
+        return get_backend().read_counter(key)
+    except Exception as e:
+        logger.error(f"Shared counter read failed for {key}: {str(e)}")
+        return _local_fallback.read_counter(key)
+
+def reserve_slot(key: str, interval: float, max_wait: Optional[float] = None) -> Optional[float]:
+    """Claim the next rate-limit slot, or None if it starts more than ``max_wait`` from now.
+
+    Paces this process alone if the backend is down.
+    """
+    try:
+        return get_backend().reserve_slot(key, interval, max_wait)
+    except Exception as e:
+        logger.error(f"Shared rate limiter unavailable for {key}, pacing locally: {str(e)}")
+        return _local_fallback.reserve_slot(key, interval, max_wait)
+
+def purge_expired() -> int:
+    try:
+        return get_backend().purge_expired()
+    except Exception as e:
+        logger.error(f"Shared cache purge failed: {str(e)}")
+        return 0
+
+def get_cache_stats() -> Dict:
+    """Return hit rates across all workers sharing the backend."""
+    cross_worker = counter("cache_cross_worker_hits")
+    hits = counter("cache_local_hits") + cross_worker
+    misses = counter("cache_misses")
+    lookups = hits + misses
+    return {
+        "backend": get_backend().name,
+        "worker_id": WORKER_ID,
+        "hits": hits,
+        "misses": misses,
+        "cross_worker_hits": cross_worker,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "cross_worker_hit_rate": round(cross_worker / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,355 @@
+#storage.py
+import os
+import json
+import shutil
+import time
+import logging
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+from app.utils import shared_cache
+
+# Configuration
+CHROMA_ROOT = os.getenv("CHROMA_ROOT", "chroma_db")
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_MB", "1024")) * 1024 * 1024
+GC_INTERVAL = 600  # seconds between background sweeps
+MANIFEST_FILE = ".storage_manifest.json"
+PINS_DIR = ".pins"  # Pin files shared by every worker using this CHROMA_ROOT
+PIN_TTL = 600  # seconds; older pin files are leftovers from crashed workers
+GC_ENABLED = True  # Batch jobs turn this off and sweep once at the end
+
+logger = logging.getLogger(__name__)
+
+# State tracking
+# video_id -> {"size": bytes, "last_access": epoch seconds}. The manifest only
+# caches sizes; last_access is the index directory's mtime, which touch()
+# bumps, so every worker sees every other worker's reads.
+_entries: Dict[str, Dict] = {}
+_in_use: Dict[str, int] = {}
+# video_id -> index generation this process's cached chroma client was opened at
+_client_generations: Dict[str, Optional[str]] = {}
+_lock = threading.RLock()
+_loaded = False
+_gc_wakeup = threading.Event()
+_gc_thread: Optional[threading.Thread] = None
+_stats = {
+    "evictions": 0,
+    "evicted_bytes": 0,
+    "rebuilds": 0,
+    "gc_runs": 0,
+    "last_gc_time": 0,
+}
+
+def index_path(video_id: str) -> str:
+    """Persist directory of the vector index for a video."""
+    return os.path.join(CHROMA_ROOT, video_id)
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _load():
+    """Load the manifest once; run_gc reconciles it with what is on disk."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    manifest_path = os.path.join(CHROMA_ROOT, MANIFEST_FILE)
+    try:
+        with open(manifest_path) as f:
+            _entries.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable storage manifest: {str(e)}")
+
+def _scan(known_sizes: Dict[str, int]) -> Dict[str, Dict]:
+    """Walk CHROMA_ROOT (without the lock); only unknown indexes are sized."""
+    found = {}
+    if not os.path.isdir(CHROMA_ROOT):
+        return found
+    for entry in os.scandir(CHROMA_ROOT):
+        if not entry.is_dir() or entry.name.startswith("."):
+            continue
+        try:
+            last_access = entry.stat().st_mtime
+        except FileNotFoundError:
+            continue
+        size = known_sizes.get(entry.name)
+        found[entry.name] = {
+            "size": _dir_size(entry.path) if size is None else size,
+            "last_access": last_access,
+        }
+    return found
+
+def _refresh():
+    """Reconcile entries with disk, picking up other workers' writes and reads."""
+    with _lock:
+        _load()
+        known_sizes = {video_id: e["size"] for video_id, e in _entries.items()}
+    found = _scan(known_sizes)
+    with _lock:
+        for video_id in list(_entries):
+            # Keep entries written while we were scanning
+            if video_id not in found and not os.path.isdir(index_path(video_id)):
+                del _entries[video_id]
+        _entries.update(found)
+
+def _save():
+    if not os.path.isdir(CHROMA_ROOT):
+        return
+    manifest_path = os.path.join(CHROMA_ROOT, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(_entries, f)
+        os.replace(tmp_path, manifest_path)
+    except Exception as e:
+        logger.error(f"Failed to save storage manifest: {str(e)}")
+
+def _generation_key(video_id: str) -> str:
+    return f"index_generation:{video_id}"
+
+def touch(video_id: str):
+    """Record a read of a video's index where every worker's GC can see it."""
+    now = time.time()
+    try:
+        os.utime(index_path(video_id), (now, now))
+    except FileNotFoundError:
+        return
+    with _lock:
+        _load()
+        if video_id in _entries:
+            _entries[video_id]["last_access"] = now
+
+def record_write(video_id: str, rebuilt: bool = False):
+    """Record a freshly written index and schedule GC if over quota."""
+    path = index_path(video_id)
+    size = _dir_size(path)
+    now = time.time()
+    try:
+        os.utime(path, (now, now))
+    except FileNotFoundError:
+        pass
+    # Other workers drop chroma clients opened at an older generation
+    generation = uuid.uuid4().hex
+    shared_cache.cache_set(_generation_key(video_id), generation)
+    with _lock:
+        _load()
+        _entries[video_id] = {"size": size, "last_access": now}
+        _client_generations[video_id] = generation
+        if rebuilt:
+            _stats["rebuilds"] += 1
+        over_quota = _total_size() > STORAGE_QUOTA_BYTES
+    if over_quota:
+        schedule_gc()
+
+def _pin_file(video_id: str, token: str) -> str:
+    return os.path.join(CHROMA_ROOT, PINS_DIR, f"{video_id}.{token}")
+
+def _pinned_ids() -> set:
+    """Videos with a fresh pin file from any worker; stale pin files are removed."""
+    pinned = set()
+    try:
+        entries = list(os.scandir(os.path.join(CHROMA_ROOT, PINS_DIR)))
+    except FileNotFoundError:
+        return pinned
+    now = time.time()
+    for entry in entries:
+        try:
+            if now - entry.stat().st_mtime < PIN_TTL:
+                pinned.add(entry.name.rsplit(".", 1)[0])
+            else:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+    return pinned
+
+def _is_pinned(video_id: str) -> bool:
+    """Pinned by this process, or by a fresh pin file from any worker."""
+    return video_id in _in_use or video_id in _pinned_ids()
+
+@contextmanager
+def using(video_id: str):
+    """Pin a video's index so no worker's GC evicts it while it is being read.
+
+    Pin before checking that the index exists; eviction re-checks pins
+    after moving the directory aside and restores it if one appeared.
+    """
+    pin = _pin_file(video_id, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    with _lock:
+        _in_use[video_id] = _in_use.get(video_id, 0) + 1
+    try:
+        os.makedirs(os.path.dirname(pin), exist_ok=True)
+        open(pin, "w").close()
+    except OSError as e:
+        logger.warning(f"Could not write pin file for {video_id}: {str(e)}")
+    try:
+        yield index_path(video_id)
+    finally:
+        try:
+            os.remove(pin)
+        except OSError:
+            pass
+        with _lock:
+            _in_use[video_id] -= 1
+            if _in_use[video_id] <= 0:
+                del _in_use[video_id]
+        touch(video_id)
+
+def _total_size() -> int:
+    return sum(e["size"] for e in _entries.values())
+
+def _forget_chroma_client(path: str):
+    """Drop this process's cached chromadb client for a directory.
+
+    Otherwise a rebuild reuses a client pointing at files that no longer exist.
+    """
+    try:
+        from chromadb.api.client import SharedSystemClient
+        cache = SharedSystemClient._identifier_to_system
+    except (ImportError, AttributeError):
+        return
+    for key in (path, os.path.abspath(path)):
+        system = cache.pop(key, None)
+        if system is not None:
+            try:
+                system.stop()
+            except Exception:
+                pass
+
+def refresh_chroma_client(video_id: str):
+    """Call before opening a video's index with chromadb.
+
+    chromadb caches one client per directory and process. If any worker
+    evicted or rebuilt the index since this process opened it, the cached
+    client points at deleted files, so drop it.
+    """
+    generation = shared_cache.cache_peek(_generation_key(video_id))
+    with _lock:
+        if video_id in _client_generations and _client_generations[video_id] != generation:
+            _forget_chroma_client(index_path(video_id))
+        _client_generations[video_id] = generation
+
+def _detach(video_id: str) -> Optional[str]:
+    """Move an unpinned index aside (a cheap rename) for deletion later."""
+    path = index_path(video_id)
+    trash = os.path.join(CHROMA_ROOT, f".trash-{video_id}-{uuid.uuid4().hex[:8]}")
+    try:
+        os.rename(path, trash)
+    except FileNotFoundError:
+        return None
+    if _is_pinned(video_id):
+        # A reader pinned it between our check and the rename
+        try:
+            os.rename(trash, path)
+            return None
+        except OSError:
+            # The reader already rebuilt it; the old copy can go
+            pass
+    return trash
+
+def _last_access(video_id: str, entry: Dict) -> float:
+    try:
+        return os.stat(index_path(video_id)).st_mtime
+    except FileNotFoundError:
+        return entry["last_access"]
+
+def enforce_quota(quota_bytes: Optional[int] = None) -> int:
+    """Evict least recently used indexes until usage fits the quota.
+
+    Indexes pinned with ``using`` (in any worker) are skipped. Only the
+    bookkeeping happens under the lock; pin checks, renames and deletes
+    don't block readers. Returns the number evicted.
+    """
+    quota_bytes = STORAGE_QUOTA_BYTES if quota_bytes is None else quota_bytes
+    with _lock:
+        _load()
+        candidates = list(_entries.items())
+        total = _total_size()
+    # Directory mtimes carry reads from every worker, not just this one
+    candidates.sort(key=lambda kv: _last_access(*kv))
+    pinned = _pinned_ids()
+
+    evicted = 0
+    for video_id, entry in candidates:
+        if total <= quota_bytes:
+            break
+        if video_id in pinned or video_id in _in_use:
+            continue
+        trash = _detach(video_id)
+        if trash is None:
+            if not os.path.exists(index_path(video_id)):
+                with _lock:
+                    _entries.pop(video_id, None)
+                total -= entry["size"]
+            continue
+        generation = uuid.uuid4().hex
+        shared_cache.cache_set(_generation_key(video_id), generation)
+        with _lock:
+            _entries.pop(video_id, None)
+            _client_generations[video_id] = generation
+            _stats["evictions"] += 1
+            _stats["evicted_bytes"] += entry["size"]
+            _forget_chroma_client(index_path(video_id))
+        total -= entry["size"]
+        evicted += 1
+        shutil.rmtree(trash, ignore_errors=True)
+        logger.info(f"Evicted index for {video_id} ({entry['size']} bytes)")
+    return evicted
+
+def run_gc():
+    """One compaction pass: reconcile with disk, evict over quota, purge expired
+    cache entries and persist the manifest."""
+    try:
+        _refresh()
+        enforce_quota()
+        for entry in os.scandir(CHROMA_ROOT) if os.path.isdir(CHROMA_ROOT) else []:
+            if entry.name.startswith(".trash-") and time.time() - entry.stat().st_ctime > 60:
+                # Left behind by a worker that died mid-eviction
+                shutil.rmtree(entry.path, ignore_errors=True)
+        purged = shared_cache.purge_expired()
+        if purged:
+            logger.debug(f"Purged {purged} expired shared cache entries")
+        with _lock:
+            _save()
+            _stats["gc_runs"] += 1
+            _stats["last_gc_time"] = time.time()
+    except Exception as e:
+        logger.error(f"Storage GC failed: {str(e)}", exc_info=True)
+
+def _gc_loop():
+    while True:
+        _gc_wakeup.wait(GC_INTERVAL)
+        _gc_wakeup.clear()
+        run_gc()
+
+def schedule_gc():
+    """Wake the background GC thread, starting it on first use."""
+    global _gc_thread
+    if not GC_ENABLED:
+        return
+    with _lock:
+        if _gc_thread is None or not _gc_thread.is_alive():
+            _gc_thread = threading.Thread(target=_gc_loop, name="storage-gc", daemon=True)
+            _gc_thread.start()
+    _gc_wakeup.set()
+
+def get_storage_stats() -> Dict:
+    """Return disk usage and eviction counters for the index store."""
+    with _lock:
+        _load()
+        return {
+            "indexed_videos": len(_entries),
+            "total_bytes": _total_size(),
+            "quota_bytes": STORAGE_QUOTA_BYTES,
+            "pinned_videos": len(_in_use),
+            **_stats,
+        }
@@ -2,10 +2,10 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 import os
 import logging
-from typing import List, Dict
-from datetime import datetime, timedelta
+from typing import List, Dict, Optional
 import time
 import hashlib
+from app.utils import shared_cache, resilience
 
 # Configuration
 MODEL_NAME = "gemini-2.0-flash-lite"  # Best free tier model
@@ -13,11 +13,10 @@ MAX_TRANSCRIPT_LENGTH = 8000  # Gemini's conservative limit
 RATE_LIMIT_DELAY = 2.1  # seconds
 CACHE_TTL = 3600  # 1 hour
 
-# State tracking
-_last_request_time = 0
-_request_count = 0
-_summary_cache = {}
-_key_points_cache = {}
+# Shared state keys (see shared_cache; visible to every worker)
+RATE_LIMIT_KEY = "gemini"
+REQUEST_COUNT_KEY = "gemini_requests"
+LAST_REQUEST_KEY = "gemini_last_request"
 
 def normalize_bullets(points: List[str]) -> List[str]:
     """Clean bullet styles (•, *, -) and remove asterisks from text."""
@@ -30,31 +29,33 @@ def normalize_bullets(points: List[str]) -> List[str]:
     return cleaned
 
 
-def _rate_limit():
-    """Throttle API calls to avoid hitting Gemini's quota."""
-    global _last_request_time, _request_count
-    elapsed = time.time() - _last_request_time
-    if elapsed < RATE_LIMIT_DELAY:
-        time.sleep(RATE_LIMIT_DELAY - elapsed)
-    _last_request_time = time.time()
-    _request_count += 1
+def reserve_gemini_slot(max_wait: float) -> Optional[float]:
+    """Reserve the next Gemini slot across all workers (resilience ``rate_limit`` hook).
+
+    Returns when the slot starts, or None if that is more than ``max_wait`` away.
+    """
+    return shared_cache.reserve_slot(RATE_LIMIT_KEY, RATE_LIMIT_DELAY, max_wait)
+
+def _count_request():
+    shared_cache.incr(REQUEST_COUNT_KEY)
+    shared_cache.cache_set(LAST_REQUEST_KEY, time.time())
 
 def _get_cache_key(text: str) -> str:
     """Generate cache key based on transcript content."""
     return hashlib.md5(text.encode()).hexdigest()
 
 def _call_gemini_with_retry(chain, input_data, max_retries=3):
-    """Wrapper with retry logic for Gemini API calls."""
-    for attempt in range(max_retries):
-        try:
-            _rate_limit()
-            return chain.invoke(input_data).content
-        except Exception as e:
-            if attempt == max_retries - 1 or 'quota' in str(e).lower():
-                raise
-            wait_time = min(2 ** attempt, 10)
-            logging.warning(f"Retry {attempt + 1}/{max_retries} - Waiting {wait_time}s")
-            time.sleep(wait_time)
+    """Gemini call guarded by the resilience layer (rate limit, breaker, AIMD limit, deadline)."""
+    def _invoke():
+        # Counted here, so calls rejected before reaching Gemini are not
+        _count_request()
+        return chain.invoke(input_data).content
+    return resilience.call(
+        f"gemini:{MODEL_NAME}",
+        _invoke,
+        retries=max_retries - 1,
+        rate_limit=reserve_gemini_slot
+    )
 
 def generate_summary(transcript: str) -> str:
     """Generate a clean summary from the transcript."""
@@ -74,8 +75,9 @@ def generate_summary(transcript: str) -> str:
             raise ValueError("Gemini API key not configured.")
 
         cache_key = _get_cache_key(transcript)
-        if cache_key in _summary_cache and _summary_cache[cache_key]['expires_at'] > datetime.now():
-            return _summary_cache[cache_key]['summary']
+        cached = shared_cache.cache_get(f"summary:{cache_key}")
+        if cached is not None:
+            return cached
 
         prompt = ChatPromptTemplate.from_template("""
             Summarize the following YouTube video transcript clearly and naturally.
@@ -99,11 +101,8 @@ def generate_summary(transcript: str) -> str:
 
         summary = result.strip()
 
-        _summary_cache[cache_key] = {
-            "summary": summary,
-            "expires_at": datetime.now() + timedelta(seconds=CACHE_TTL)
-        }
-        _sync_caches(cache_key)
+        shared_cache.cache_set(f"summary:{cache_key}", summary, CACHE_TTL)
+        _sync_caches(cache_key, "key_points")
 
         return summary
 
@@ -129,8 +128,9 @@ def generate_key_points(transcript: str) -> List[str]:
             raise ValueError("Gemini API key not configured.")
 
         cache_key = _get_cache_key(transcript)
-        if cache_key in _key_points_cache and _key_points_cache[cache_key]['expires_at'] > datetime.now():
-            return _key_points_cache[cache_key]['key_points']
+        cached = shared_cache.cache_get(f"key_points:{cache_key}")
+        if cached is not None:
+            return cached
 
         prompt = ChatPromptTemplate.from_template("""
             Extract the 5 most important key points from this YouTube transcript.
@@ -165,11 +165,8 @@ def generate_key_points(transcript: str) -> List[str]:
             
         key_points = normalize_bullets(raw_points)
 
-        _key_points_cache[cache_key] = {
-            "key_points": key_points,
-            "expires_at": datetime.now() + timedelta(seconds=CACHE_TTL)
-        }
-        _sync_caches(cache_key)
+        shared_cache.cache_set(f"key_points:{cache_key}", key_points, CACHE_TTL)
+        _sync_caches(cache_key, "summary")
 
         return key_points
 
@@ -177,26 +174,27 @@ def generate_key_points(transcript: str) -> List[str]:
         logging.error(f"Key point extraction failed: {e}", exc_info=True)
         return ["Error generating key points."]
 
-def _sync_caches(cache_key: str):
-    """Ensure summary and key points caches expire together."""
+def _sync_caches(cache_key: str, companion: str):
+    """Ensure summary and key points caches expire together.
+
+    Re-writes the companion entry (if present) with a fresh TTL so it
+    expires with the entry that was just stored.
+    """
     try:
-        if cache_key in _summary_cache and cache_key in _key_points_cache:
-            expiry = max(
-                _summary_cache[cache_key]["expires_at"],
-                _key_points_cache[cache_key]["expires_at"]
-            )
-            _summary_cache[cache_key]["expires_at"] = expiry
-            _key_points_cache[cache_key]["expires_at"] = expiry
+        backend = shared_cache.get_backend()
+        value = backend.get(f"{companion}:{cache_key}")
+        if value is not None:
+            backend.set(f"{companion}:{cache_key}", value, CACHE_TTL)
     except Exception as e:
         logging.error(f"Cache sync failed: {e}", exc_info=True)
 
 def get_usage_metrics() -> Dict:
-    """Return API usage metrics."""
-    active_cache = sum(1 for v in _summary_cache.values() if v['expires_at'] > datetime.now())
-    active_cache += sum(1 for v in _key_points_cache.values() if v['expires_at'] > datetime.now())
+    """Return API usage metrics aggregated across workers."""
+    cache_stats = shared_cache.get_cache_stats()
     return {
-        "total_requests": _request_count,
-        "cache_hits": active_cache,
-        "last_request_time": _last_request_time,
-        "current_model": MODEL_NAME
+        "total_requests": shared_cache.counter(REQUEST_COUNT_KEY),
+        "cache_hits": cache_stats["hits"],
+        "last_request_time": shared_cache.cache_peek(LAST_REQUEST_KEY) or 0,
+        "current_model": MODEL_NAME,
+        "cache": cache_stats
     }
@@ -1,16 +1,33 @@
 import re
-from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound
+import os
+from youtube_transcript_api import (
+    YouTubeTranscriptApi,
+    NoTranscriptFound,
+    TranscriptsDisabled,
+    VideoUnavailable,
+)
 from urllib.parse import urlparse, parse_qs
 import time
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
 import pytube
-from typing import Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+from app.utils import shared_cache
 
-# Rate limiting
-LAST_REQUEST_TIME = 0
+# Rate limiting (shared across workers via shared_cache)
+RATE_LIMIT_KEY = "youtube"
 MIN_REQUEST_INTERVAL = 1  # 1 second between requests
 
+# Pagination
+SEGMENT_WORDS = 50  # Words per segment when the transcript has no caption blocks
+
+# Caption selection
+PREFERRED_LANGUAGES = ['en', 'hi']  # In order of preference
+NEGATIVE_CACHE_TTL = 6 * 3600  # Remember "no captions" for 6 hours
+TRANSCRIPT_CACHE_TTL = 24 * 3600
+HEDGED_FETCH = os.getenv("TRANSCRIPT_HEDGED", "").lower() in ("1", "true", "yes")
+
 logger = logging.getLogger(__name__)
 
 def validate_youtube_url(url: str) -> bool:
@@ -60,18 +77,50 @@ def get_video_id(url: str) -> str:
     
     raise ValueError(f"Could not extract video ID from URL: {url}")
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+class TranscriptUnavailable(ValueError):
+    """The video has no usable captions; retrying will not help."""
+
+def _pick_transcript(transcript_list, languages: List[str] = PREFERRED_LANGUAGES):
+    """Choose the best track from an already fetched listing.
+
+    Manually created tracks win over auto-generated ones for the same
+    language, and regional variants (e.g. ``en-GB``) count as their base language.
+    """
+    tracks = list(transcript_list)
+    for language in languages:
+        for generated in (False, True):
+            for track in tracks:
+                if track.language_code.split('-')[0] == language and track.is_generated == generated:
+                    return track
+    return None
+
+def _list_transcripts(video_id: str):
+    """List caption tracks with either the 0.6.x or the 1.x API"""
+    if hasattr(YouTubeTranscriptApi, 'list_transcripts'):
+        return YouTubeTranscriptApi.list_transcripts(video_id)
+    return YouTubeTranscriptApi().list(video_id)
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=1, max=4),
+    retry=retry_if_not_exception_type(ValueError),
+    reraise=True
+)
 def get_youtube_transcript(video_id: str) -> tuple[list, str]:
-    """Get transcript with retry logic and language fallback"""
+    """Get transcript from a single track listing, retrying only transient errors"""
     try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['en'])
-        return transcript, 'en'
-    except NoTranscriptFound:
-        try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['hi'])
-            return transcript, 'hi'
-        except NoTranscriptFound:
-            raise ValueError("No English or Hindi transcript available")
+        transcript_list = _list_transcripts(video_id)
+    except (TranscriptsDisabled, NoTranscriptFound, VideoUnavailable) as e:
+        raise TranscriptUnavailable(f"Captions unavailable: {type(e).__name__}") from e
+
+    track = _pick_transcript(transcript_list)
+    if track is None:
+        raise TranscriptUnavailable("No English or Hindi transcript available")
+    fetched = track.fetch()
+    # 1.x returns a FetchedTranscript of snippet objects; 0.6.x returns dicts
+    if hasattr(fetched, 'to_raw_data'):
+        fetched = fetched.to_raw_data()
+    return fetched, track.language_code.split('-')[0]
 
 def get_manual_captions(video_id: str) -> Optional[str]:
     """Fallback method with improved error handling"""
@@ -96,33 +145,124 @@ def get_manual_captions(video_id: str) -> Optional[str]:
         logger.error(f"Manual caption fetch failed: {str(e)}", exc_info=True)
         return None
 
+def _api_source(video_id: str) -> Tuple[str, str]:
+    """Primary source: youtube-transcript-api"""
+    transcript_data, language = get_youtube_transcript(video_id)
+    logging.info(f"Successfully retrieved {language} transcript with {len(transcript_data)} segments")
+    return ' '.join([item['text'] for item in transcript_data]), language
+
+def _manual_source(video_id: str) -> Tuple[str, str]:
+    """Fallback source: pytube caption tracks"""
+    manual_captions = get_manual_captions(video_id)
+    if not manual_captions:
+        raise TranscriptUnavailable("No manual captions available")
+    logging.info(f"Successfully retrieved manual captions for video {video_id}")
+    return manual_captions, 'en'
+
+# Ordered (name, fetcher) pairs. Each fetcher takes a video ID and returns
+# (transcript, language) or raises; TranscriptUnavailable marks a permanent miss.
+TRANSCRIPT_SOURCES: List[Tuple[str, Callable[[str], Tuple[str, str]]]] = [
+    ("youtube_transcript_api", _api_source),
+    ("pytube", _manual_source),
+]
+
+def _check_negative_cache(video_id: str):
+    reason = shared_cache.cache_peek(f"no_transcript:{video_id}")
+    if reason is not None:
+        logging.debug(f"Negative cache hit for {video_id}: {reason}")
+        raise TranscriptUnavailable(reason)
+
+def _remember_unavailable(video_id: str, errors: Dict[str, Exception]):
+    """Cache a miss only when every source reported a permanent failure"""
+    if errors and all(isinstance(e, TranscriptUnavailable) for e in errors.values()):
+        reason = str(next(iter(errors.values())))
+        shared_cache.cache_set(f"no_transcript:{video_id}", reason, NEGATIVE_CACHE_TTL)
+
+def _fetch_sequential(video_id: str, sources, errors: Dict[str, Exception]) -> Optional[Tuple[str, str]]:
+    for name, fetch in sources:
+        try:
+            return fetch(video_id)
+        except Exception as e:
+            logging.warning(f"Transcript source {name} failed for {video_id}: {str(e)}")
+            errors[name] = e
+    return None
+
+def _fetch_hedged(video_id: str, sources, errors: Dict[str, Exception]) -> Optional[Tuple[str, str]]:
+    """Race all sources and return the first success"""
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="transcript")
+    try:
+        futures = {executor.submit(fetch, video_id): name for name, fetch in sources}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+                logging.info(f"Hedged transcript fetch won by {name} for {video_id}")
+                return result
+            except Exception as e:
+                logging.warning(f"Transcript source {name} failed for {video_id}: {str(e)}")
+                errors[name] = e
+        return None
+    finally:
+        # Losers keep running in the background; don't wait for them
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def fetch_transcript(video_id: str, sources=None, hedged: Optional[bool] = None) -> Tuple[str, str]:
+    """Fetch a transcript for a video ID from the configured sources.
+
+    Results, including "no captions" misses, are kept in the shared cache.
+    Sources are tried in order, or raced when hedged mode is enabled.
+    Pass ``sources`` to substitute the fetchers (e.g. with test doubles).
+    """
+    cached = shared_cache.cache_get(f"transcript:{video_id}")
+    if cached is not None:
+        return tuple(cached)
+    _check_negative_cache(video_id)
+
+    # Rate limiting; cache hits above skip it
+    wait_time = shared_cache.reserve_slot(RATE_LIMIT_KEY, MIN_REQUEST_INTERVAL) - time.time()
+    if wait_time > 0:
+        logging.debug(f"Rate limiting - waiting {wait_time:.2f} seconds")
+        time.sleep(wait_time)
+
+    sources = list(sources if sources is not None else TRANSCRIPT_SOURCES)
+    hedged = HEDGED_FETCH if hedged is None else hedged
+    errors: Dict[str, Exception] = {}
+
+    if hedged and len(sources) > 1:
+        result = _fetch_hedged(video_id, sources, errors)
+    else:
+        result = _fetch_sequential(video_id, sources, errors)
+    if result is not None:
+        shared_cache.cache_set(f"transcript:{video_id}", list(result), TRANSCRIPT_CACHE_TTL)
+        return result
+
+    _remember_unavailable(video_id, errors)
+    for error in errors.values():
+        if isinstance(error, TranscriptUnavailable):
+            raise error
+    raise ValueError(f"Could not fetch transcript for video {video_id}")
+
+def split_segments(transcript: str) -> List[str]:
+    """Split a transcript into addressable segments for pagination.
+
+    SRT captions split on their cue blocks; plain transcripts into
+    fixed windows of SEGMENT_WORDS words.
+    """
+    if not transcript:
+        return []
+    if '-->' in transcript:
+        return [block.strip() for block in re.split(r'\n\s*\n', transcript) if block.strip()]
+    words = transcript.split()
+    return [' '.join(words[i:i + SEGMENT_WORDS]) for i in range(0, len(words), SEGMENT_WORDS)]
+
 def get_transcript(url: str) -> tuple[str, str]:
-    global LAST_REQUEST_TIME
     try:
         logging.info(f"Starting transcript processing for URL: {url}")
         
-        # Rate limiting
-        elapsed = time.time() - LAST_REQUEST_TIME
-        if elapsed < MIN_REQUEST_INTERVAL:
-            wait_time = MIN_REQUEST_INTERVAL - elapsed
-            logging.debug(f"Rate limiting - waiting {wait_time:.2f} seconds")
-            time.sleep(wait_time)
-        LAST_REQUEST_TIME = time.time()
-        
         video_id = get_video_id(url)
         logging.info(f"Extracted video ID: {video_id}")
         
-        try:
-            transcript_data, language = get_youtube_transcript(video_id)
-            transcript = ' '.join([item['text'] for item in transcript_data])
-            logging.info(f"Successfully retrieved {language} transcript with {len(transcript_data)} segments")
-            return transcript, language
-        except ValueError as e:
-            manual_captions = get_manual_captions(video_id)
-            if manual_captions:
-                logging.info(f"Successfully retrieved manual captions for video {video_id}")
-                return manual_captions, 'en'
-            raise
+        return fetch_transcript(video_id)
     except ValueError as ve:
         logging.warning(f"Input validation error: {str(ve)}")
         raise ve
@@ -1,7 +1,13 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import analyze, ask
+from brotli_asgi import BrotliMiddleware
+from app.routes import analyze, ask, debug
+from app.utils.storage import schedule_gc
+from app.utils.resilience import deadline_scope, requested_deadline
+from app.utils.profiling import profile_requests
+from app.utils.admission import admit_requests
 import os
+import time
 from dotenv import load_dotenv
 import logging
 from pathlib import Path
@@ -24,18 +30,8 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
-# CORS Configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:5173",
-        "http://127.0.0.1:5173",
-        "https://ytbuddy1-1.onrender.com"  # Add your production frontend URL
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Brotli when the client accepts it, gzip otherwise
+app.add_middleware(BrotliMiddleware, minimum_size=1000, gzip_fallback=True)
 
 # Verify environment variables
 assert os.getenv('GEMINI_API_KEY'), "GEMINI_API_KEY missing"
@@ -45,11 +41,18 @@ print(f"Gemini Key Loaded: {bool(os.getenv('GEMINI_API_KEY'))}")
 # Include routes
 app.include_router(analyze.router, prefix="/api", tags=["analyze"])
 app.include_router(ask.router, prefix="/api", tags=["ask"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"])
+
+@app.on_event("startup")
+async def start_storage_gc():
+    # Reconcile chroma_db with the manifest and enforce the quota in the background
+    schedule_gc()
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"Incoming request: {request.method} {request.url}")
-    logger.debug(f"Headers: {dict(request.headers)}")
+    headers = {k: v for k, v in request.headers.items() if k != 'x-admin-token'}
+    logger.debug(f"Headers: {headers}")
     
     try:
         if request.method == "POST":
@@ -61,21 +64,37 @@ async def log_requests(request: Request, call_next):
     response = await call_next(request)
     return response
 
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    # Outbound calls made while serving this request share its deadline
+    seconds = requested_deadline(request.headers.get("x-request-timeout"))
+    # The budget started when the request arrived, not when admission let it through
+    received_at = getattr(request.state, "received_at", None)
+    if received_at is not None:
+        seconds -= time.time() - received_at
+    with deadline_scope(max(seconds, 0)):
+        return await call_next(request)
+
+# Profile the request once admitted; queue time is reported by admission metrics
+app.middleware("http")(profile_requests)
+
+# Outermost after CORS, so overload is shed before any other work
+app.middleware("http")(admit_requests)
+
+# CORS Configuration (registered last so it is outermost and 429s carry CORS headers too)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[
+        "http://localhost:5173",
+        "http://127.0.0.1:5173",
+        "https://ytbuddy1-1.onrender.com"  # Add your production frontend URL
+    ],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Retry-After", "ETag", "X-Profile-Id"],
+)
+
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
-
-@app.get("/debug/packages")
-async def debug_packages():
-    import youtube_transcript_api
-    import pytube
-    return {
-        "youtube_transcript_api": {
-            "version": youtube_transcript_api.__version__,
-            "attributes": dir(youtube_transcript_api)
-        },
-        "pytube": {
-            "version": pytube.__version__,
-            "attributes": dir(pytube)
-        }
-    }
\ No newline at end of file
+    return {"status": "ok"}
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""Offline bulk pre-indexing.
+
+Builds transcripts, summaries, key points and vector indexes for known
+videos without going through HTTP, so a fresh deployment starts warm.
+
+    python preindex.py VIDEO_ID [VIDEO_ID ...]
+    python preindex.py --ids-file ids.txt --workers 4
+    python preindex.py --transcripts-dir transcripts/   # {video_id}.srt / .txt
+
+Artifacts go where the server looks for them (shared cache and chroma_db),
+so run it from the server directory with the same CACHE_BACKEND settings.
+Completed videos are appended to the checkpoint file and skipped on re-runs.
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+VIDEO_ID_PATTERN = re.compile(r'^[a-zA-Z0-9_-]{11}$')
+DEFAULT_CHECKPOINT = "preindex_checkpoint.jsonl"
+DEFAULT_CACHE_TTL = 7 * 24 * 3600  # Pre-built summaries outlive the server's 1 hour default
+
+logger = logging.getLogger("preindex")
+
+def srt_to_text(srt: str) -> str:
+    """Strip cue numbers and timings from SRT captions."""
+    lines = []
+    for line in srt.splitlines():
+        line = line.strip()
+        if not line or line.isdigit() or '-->' in line:
+            continue
+        lines.append(line)
+    return ' '.join(lines)
+
+def _init_worker(cache_ttl: int):
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from app.utils import summarizer, transcript, storage
+    summarizer.CACHE_TTL = cache_ttl
+    transcript.TRANSCRIPT_CACHE_TTL = cache_ttl
+    # One GC thread per worker would race on eviction; main() sweeps once at the end
+    storage.GC_ENABLED = False
+
+def process_one(video_id: str, transcript_file: str = None, language: str = "en") -> dict:
+    """Run transcript -> summary/key points -> embeddings for one video (in a pool worker)."""
+    from app.utils import shared_cache, summarizer, storage
+    from app.utils.transcript import fetch_transcript
+    from app.utils.embed_store import store_embeddings
+
+    start = time.time()
+    try:
+        if transcript_file:
+            with open(transcript_file, encoding="utf-8") as f:
+                text = f.read()
+            if transcript_file.endswith(".srt"):
+                text = srt_to_text(text)
+            shared_cache.cache_set(f"transcript:{video_id}", [text, language], summarizer.CACHE_TTL)
+        else:
+            # Goes through the shared rate limiter, so workers respect the server's pacing
+            text, language = fetch_transcript(video_id)
+
+        summary = summarizer.generate_summary(text)
+        if summary.startswith("Error"):
+            raise RuntimeError("Summary generation failed")
+        key_points = summarizer.generate_key_points(text)
+        if key_points == ["Error generating key points."]:
+            raise RuntimeError("Key point generation failed")
+
+        if not os.path.exists(storage.index_path(video_id)):
+            store_embeddings(video_id, text)
+
+        return {"video_id": video_id, "status": "ok", "seconds": round(time.time() - start, 2)}
+    except Exception as e:
+        return {
+            "video_id": video_id,
+            "status": "failed",
+            "error": f"{type(e).__name__}: {str(e)}",
+            "seconds": round(time.time() - start, 2)
+        }
+
+def load_checkpoint(path: str) -> dict:
+    """Return video_id -> last recorded status."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                done[entry["video_id"]] = entry["status"]
+            except (ValueError, KeyError):
+                continue
+    return done
+
+def collect_jobs(args) -> list:
+    """Return (video_id, transcript_file) pairs from the command line inputs."""
+    jobs = [(vid, None) for vid in args.video_ids]
+    if args.ids_file:
+        with open(args.ids_file) as f:
+            jobs += [(line.strip(), None) for line in f if line.strip() and not line.startswith("#")]
+    if args.transcripts_dir:
+        for name in sorted(os.listdir(args.transcripts_dir)):
+            video_id, ext = os.path.splitext(name)
+            if ext in (".srt", ".txt"):
+                jobs.append((video_id, os.path.join(args.transcripts_dir, name)))
+
+    valid, seen = [], set()
+    for video_id, path in jobs:
+        if not VIDEO_ID_PATTERN.match(video_id):
+            logger.warning(f"Skipping invalid video ID: {video_id}")
+        elif video_id not in seen:
+            seen.add(video_id)
+            valid.append((video_id, path))
+    return valid
+
+def print_stats(results: list, skipped: int, elapsed: float):
+    ok = [r for r in results if r["status"] == "ok"]
+    failed = [r for r in results if r["status"] == "failed"]
+    reasons = Counter(r["error"].split(":")[0] for r in failed)
+    print("\n=== PRE-INDEX SUMMARY ===")
+    print(f"Processed:  {len(results)} ({len(ok)} ok, {len(failed)} failed)")
+    print(f"Skipped:    {skipped} (already in checkpoint)")
+    print(f"Elapsed:    {elapsed:.1f}s")
+    if results and elapsed > 0:
+        print(f"Throughput: {len(ok) / elapsed * 60:.1f} videos/min")
+    if ok:
+        print(f"Avg time:   {sum(r['seconds'] for r in ok) / len(ok):.1f}s per video")
+    for reason, count in reasons.most_common():
+        print(f"  {reason}: {count}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-build transcripts, summaries and indexes for videos")
+    parser.add_argument("video_ids", nargs="*", help="YouTube video IDs")
+    parser.add_argument("--ids-file", help="File with one video ID per line")
+    parser.add_argument("--transcripts-dir", help="Directory of {video_id}.srt / .txt transcripts")
+    parser.add_argument("--language", default="en", help="Language of local transcripts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--retry-failed", action="store_true", help="Re-run videos that failed previously")
+    parser.add_argument("--cache-ttl", type=int, default=DEFAULT_CACHE_TTL, help="Seconds to keep cached artifacts")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if not os.getenv("GEMINI_API_KEY"):
+        logger.error("GEMINI_API_KEY missing")
+        return 2
+    if os.getenv("CACHE_BACKEND", "sqlite") == "memory":
+        logger.error("CACHE_BACKEND=memory is per-process; the server would not see the results")
+        return 2
+
+    jobs = collect_jobs(args)
+    if not jobs:
+        parser.error("no video IDs or transcripts given")
+
+    previous = load_checkpoint(args.checkpoint)
+    pending = [
+        (vid, path) for vid, path in jobs
+        if previous.get(vid) != "ok" and (args.retry_failed or previous.get(vid) != "failed")
+    ]
+    skipped = len(jobs) - len(pending)
+    logger.info(f"{len(pending)} videos to process, {skipped} skipped, {args.workers} workers")
+
+    results = []
+    aborted = False
+    start = time.time()
+    # spawn: workers must not inherit the parent's SQLite connections or threads
+    context = multiprocessing.get_context("spawn")
+    try:
+        with open(args.checkpoint, "a") as checkpoint, ProcessPoolExecutor(
+            max_workers=args.workers, mp_context=context, initializer=_init_worker, initargs=(args.cache_ttl,)
+        ) as pool:
+            futures = [pool.submit(process_one, vid, path, args.language) for vid, path in pending]
+            try:
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    checkpoint.write(json.dumps(result) + "\n")
+                    checkpoint.flush()
+                    status = result["status"] if result["status"] == "ok" else f"failed ({result['error']})"
+                    logger.info(f"[{len(results)}/{len(pending)}] {result['video_id']}: {status}")
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    except KeyboardInterrupt:
+        aborted = True
+        logger.warning("Interrupted; progress saved to checkpoint")
+    except BrokenProcessPool as e:
+        aborted = True
+        logger.error(f"A worker process died ({str(e)}); progress saved to checkpoint")
+
+    if not aborted:
+        # Workers don't run storage GC; enforce the quota once for the whole batch
+        from app.utils import storage
+        storage.run_gc()
+
+    print_stats(results, skipped, time.time() - start)
+    return 1 if aborted or any(r["status"] == "failed" for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the server's `app` package the same way main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import shared_cache
+
+
+@pytest.fixture(autouse=True)
+def memory_cache():
+    """Isolate every test in a fresh per-process cache backend."""
+    backend = shared_cache.MemoryBackend()
+    shared_cache.set_backend(backend)
+    yield backend
+    shared_cache.set_backend(None)
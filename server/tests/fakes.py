@@ -0,0 +1,67 @@
+"""Test doubles for transcript sources and upstream model calls."""
+import time
+
+
+class FakeSource:
+    """Transcript source returning ``result`` or raising ``error`` after ``delay`` seconds."""
+
+    def __init__(self, result=None, error=None, delay=0.0):
+        self.result = result
+        self.error = error
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, video_id):
+        self.calls.append(video_id)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class FakeUpstream:
+    """Model call that plays a script of outcomes, one per call.
+
+    Each step is ``None`` (success), an exception instance to raise, or a
+    number of seconds of latency before succeeding. The last step repeats
+    once the script runs out.
+    """
+
+    def __init__(self, *script, result="ok"):
+        self.script = list(script) or [None]
+        self.result = result
+        self.calls = 0
+
+    @classmethod
+    def quota_exceeded(cls):
+        return Exception("429 Resource exhausted: quota exceeded")
+
+    def __call__(self):
+        step = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        if isinstance(step, BaseException):
+            raise step
+        if step:
+            time.sleep(step)
+        return self.result
+
+
+class FakeDocument:
+    """Just the fields of a langchain Document that the context builder reads."""
+
+    def __init__(self, page_content, metadata=None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+
+class FakeVectorStore:
+    """Returns the given (document, relevance score) pairs, best first."""
+
+    def __init__(self, scored):
+        self.scored = scored
+        self.queries = []
+
+    def similarity_search_with_relevance_scores(self, question, k=4):
+        self.queries.append((question, k))
+        return self.scored[:k]
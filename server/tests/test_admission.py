@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+
+from app.utils import admission
+
+ORIGIN = "http://localhost:5173"
+
+
+@pytest.fixture
+def busy_ask(monkeypatch):
+    cls = admission.EndpointClass("ask", priority=0, limit=1, queue_limit=0, max_wait=1, service_time=3)
+    cls.inflight = 1
+    monkeypatch.setitem(admission.ENDPOINT_CLASSES, "/api/ask", cls)
+    return cls
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.post("/api/ask")
+    async def ask():
+        return {"ok": True}
+
+    app.middleware("http")(admission.admit_requests)
+    app.add_middleware(CORSMiddleware, allow_origins=[ORIGIN], allow_methods=["*"],
+                       allow_headers=["*"], expose_headers=["Retry-After"])
+    return app
+
+
+def test_shed_responses_carry_cors_headers(busy_ask):
+    response = TestClient(make_app()).post("/api/ask", headers={"Origin": ORIGIN})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "3"  # one service time ahead
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+    assert "Retry-After" in response.headers["access-control-expose-headers"]
+    assert busy_ask.shed["queue_full"] == 1
+
+
+def test_client_id_uses_the_proxy_appended_hop():
+    client = SimpleNamespace(host="10.0.0.2")
+    spoofed = SimpleNamespace(headers={"x-forwarded-for": "1.2.3.4, 203.0.113.7"}, client=client)
+    direct = SimpleNamespace(headers={}, client=client)
+    assert admission._client_id(spoofed) == "203.0.113.7"
+    assert admission._client_id(direct) == "10.0.0.2"
@@ -0,0 +1,104 @@
+import pytest
+
+pytest.importorskip("langchain_google_genai")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import analyze
+
+VIDEO_ID = "dQw4w9WgXcQ"
+URL = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Replace the transcript/summary pipeline; records the videos it ran for."""
+    calls = []
+
+    async def fake_process_video(video_id):
+        calls.append(video_id)
+        return {
+            "status": "success",
+            "analysis": {
+                "summary": "A summary.",
+                "key_points": ["One", "Two"],
+                "language": "en",
+                "transcript": "word " * 60,
+            },
+            "video_id": video_id,
+            "timestamp": "2024-01-01T00:00:00",
+        }
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setattr(analyze, "process_video", fake_process_video)
+    return calls
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(analyze.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_fields_selects_analysis_keys(client, pipeline):
+    response = client.post("/api/analyze?fields=summary,key_points", json={"url": URL})
+    assert response.status_code == 200
+    assert set(response.json()["analysis"]) == {"summary", "key_points"}
+
+
+def test_unknown_field_is_rejected(client, pipeline):
+    response = client.post("/api/analyze?fields=summary,bogus", json={"url": URL})
+    assert response.status_code == 400
+    assert "bogus" in response.json()["detail"]
+    assert pipeline == []
+
+
+def test_matching_etag_skips_the_pipeline(client, pipeline):
+    first = client.post("/api/analyze", json={"url": URL})
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+
+    for validator in (etag, etag.removeprefix("W/"), f'"other", {etag}', "*"):
+        response = client.post("/api/analyze", json={"url": URL}, headers={"If-None-Match": validator})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+    assert pipeline == [VIDEO_ID]
+
+    changed = client.post("/api/analyze", json={"url": URL}, headers={"If-None-Match": '"other"'})
+    assert changed.status_code == 200
+    assert len(pipeline) == 2
+
+
+def test_etag_depends_on_selected_fields(client, pipeline):
+    full = client.post("/api/analyze", json={"url": URL}).headers["etag"]
+    summary_only = client.post("/api/analyze?fields=summary", json={"url": URL}).headers["etag"]
+    assert full != summary_only
+
+
+@pytest.fixture
+def transcript(monkeypatch):
+    # 250 words -> 5 segments of SEGMENT_WORDS (50) words
+    text = " ".join(f"w{i}" for i in range(250))
+    monkeypatch.setattr(analyze, "fetch_transcript", lambda video_id: (text, "en"))
+
+
+def test_transcript_pages(client, transcript):
+    page = client.get(f"/api/transcript/{VIDEO_ID}?start=0&limit=2").json()
+    assert (page["start"], page["end"], page["next_start"]) == (0, 2, 2)
+    assert page["total_segments"] == 5
+    assert page["segments"][0].startswith("w0 ")
+
+    last = client.get(f"/api/transcript/{VIDEO_ID}?start=4&limit=2").json()
+    assert (last["end"], last["next_start"], len(last["segments"])) == (5, None, 1)
+
+    past_end = client.get(f"/api/transcript/{VIDEO_ID}?start=9&limit=2").json()
+    assert past_end["segments"] == [] and past_end["next_start"] is None
+
+
+def test_transcript_paging_bounds_are_validated(client, transcript):
+    assert client.get(f"/api/transcript/{VIDEO_ID}?start=-1").status_code == 422
+    assert client.get(f"/api/transcript/{VIDEO_ID}?limit=0").status_code == 422
+    assert client.get(f"/api/transcript/{VIDEO_ID}?limit={analyze.MAX_SEGMENT_PAGE + 1}").status_code == 422
+    assert client.get("/api/transcript/not-an-id").status_code == 400
@@ -0,0 +1,86 @@
+from app.utils.context_builder import (
+    CHARS_PER_TOKEN, MIN_OVERLAP, _merge_adjacent, _overlap, build_context, estimate_tokens,
+)
+from fakes import FakeDocument, FakeVectorStore
+
+WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike".split()
+
+
+def chunk(text, index):
+    return FakeDocument(text, {"chunk": index})
+
+
+def passage(seed, tokens):
+    """Distinct text of roughly ``tokens`` tokens, sharing no shingles with other seeds."""
+    words, n = [], 0
+    while len(" ".join(words)) < tokens * CHARS_PER_TOKEN:
+        words.append(f"{WORDS[n % len(WORDS)]}{seed}")
+        n += 1
+    return " ".join(words)[:tokens * CHARS_PER_TOKEN]
+
+
+def test_short_coincidental_matches_are_not_overlap():
+    assert _overlap("the cat sat", "the dog ran") == 0
+    assert _overlap("Hello there", "everyone") == 0
+
+
+def test_neighbours_without_overlap_are_joined_with_a_space():
+    assert _merge_adjacent([chunk("the cat sat", 0), chunk("the dog ran", 1)]) == ["the cat sat the dog ran"]
+    assert _merge_adjacent([chunk("Hello there", 0), chunk("everyone", 1)]) == ["Hello there everyone"]
+
+
+def test_splitter_overlap_is_kept_once():
+    shared = "and then the speaker explains the main idea"
+    assert len(shared) >= MIN_OVERLAP
+    left = "At the start of the talk " + shared
+    right = shared + " using three examples."
+    assert _merge_adjacent([chunk(right, 4), chunk(left, 3)]) == [
+        "At the start of the talk " + shared + " using three examples."
+    ]
+
+
+def test_non_adjacent_chunks_stay_separate():
+    assert _merge_adjacent([chunk("first passage", 0), chunk("later passage", 5)]) == [
+        "first passage", "later passage"
+    ]
+
+
+def test_context_stays_within_the_token_budget():
+    scored = [(chunk(passage(i, 100), i * 10), 0.9 - i * 0.01) for i in range(5)]
+    context, stats = build_context(FakeVectorStore(scored), "question", token_budget=250)
+    assert stats["chunks_used"] == 2
+    assert stats["context_tokens"] <= 250
+    assert stats["candidate_tokens"] == 500
+
+
+def test_oversized_first_chunk_is_truncated_to_the_budget():
+    big = chunk(passage(1, 3000), 0)
+    context, stats = build_context(FakeVectorStore([(big, 0.9)]), "question", token_budget=100)
+    assert stats["chunks_used"] == 1
+    assert estimate_tokens(context) == 100
+    assert big.page_content.startswith(context)
+
+
+def test_adaptive_cut_drops_candidates_after_the_largest_score_gap():
+    scores = [0.91, 0.9, 0.88, 0.4, 0.39]
+    scored = [(chunk(passage(i, 20), i * 10), score) for i, score in enumerate(scores)]
+    store = FakeVectorStore(scored)
+    context, stats = build_context(store, "question", fetch_k=5)
+    assert store.queries == [("question", 5)]
+    assert stats["candidates"] == 5
+    assert stats["chunks_used"] == 3
+    assert passage(3, 20) not in context
+
+
+def test_mmr_drops_near_duplicates():
+    text = passage(1, 50)
+    scored = [
+        (chunk(text, 0), 0.9),
+        (chunk(text, 10), 0.89),  # same text from another part of the video
+        (chunk(passage(2, 50), 20), 0.88),
+        (chunk(passage(3, 50), 30), 0.2),  # cut off by the score gap
+    ]
+    context, stats = build_context(FakeVectorStore(scored), "question")
+    assert stats["chunks_used"] == 2
+    assert context.count(text) == 1
+    assert passage(2, 50) in context
@@ -0,0 +1,57 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import preindex
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+class FakePool:
+    """Stands in for ProcessPoolExecutor; every future fails with ``error``."""
+
+    def __init__(self, error, **kwargs):
+        self.error = error
+        self.shut_down = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(self.error)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setenv("CACHE_BACKEND", "sqlite")
+    return ["--checkpoint", str(tmp_path / "checkpoint.jsonl"), VIDEO_ID]
+
+
+def test_broken_pool_prints_stats_and_returns(env, monkeypatch, capsys):
+    monkeypatch.setattr(preindex, "ProcessPoolExecutor", lambda **kw: FakePool(BrokenProcessPool("worker died")))
+    assert preindex.main(env) == 1
+    assert "PRE-INDEX SUMMARY" in capsys.readouterr().out
+
+
+def test_ctrl_c_cancels_pending_work_and_prints_stats(env, monkeypatch, capsys):
+    pool = FakePool(RuntimeError("unused"))
+    monkeypatch.setattr(preindex, "ProcessPoolExecutor", lambda **kw: pool)
+
+    def interrupted(futures):
+        raise KeyboardInterrupt
+        yield
+
+    monkeypatch.setattr(preindex, "as_completed", interrupted)
+    assert preindex.main(env) == 1
+    assert pool.shut_down
+    assert "PRE-INDEX SUMMARY" in capsys.readouterr().out
@@ -0,0 +1,63 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import profiling
+from app.utils.profiling import RequestProfiler
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "secret")
+    return tmp_path / "profiles"
+
+
+def test_only_one_sampler_runs_at_a_time():
+    first = RequestProfiler("sample")
+    assert first.start()
+    second = RequestProfiler("sample")
+    assert not second.start()
+    first.stop()
+
+    third = RequestProfiler("sample")
+    assert third.start()
+    assert isinstance(third.stop(), bytes)
+
+
+def test_non_ascii_admin_token_is_rejected_not_an_error():
+    assert profiling.is_admin("secret")
+    assert not profiling.is_admin("sécret")
+    assert not profiling.is_admin(None)
+
+
+def test_non_ascii_token_header_does_not_break_requests():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.middleware("http")(profiling.profile_requests)
+    response = TestClient(app).get("/ping", headers={"X-Profile": "1", "X-Admin-Token": "s\xe9cret".encode("latin-1")})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+
+def test_profiles_are_shared_through_the_profile_dir(profile_dir):
+    profile_id = profiling.record_profile("POST", "/api/ask", 1.5, "sample", "requested", b"main;ask 3\n")
+    # Any worker reading the same directory sees it
+    assert [p["id"] for p in profiling.list_profiles()] == [profile_id]
+    profile = profiling.get_profile(profile_id)
+    assert profile["data"] == b"main;ask 3\n"
+    assert profile["path"] == "/api/ask"
+    assert profiling.get_profile("../../etc/passwd") is None
+    assert profiling.get_profile("0" * 12) is None
+
+
+def test_only_the_newest_profiles_are_kept(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, "MAX_PROFILES", 2)
+    ids = [profiling.record_profile("GET", f"/{i}", 0.1, "sample", "slow", b"x") for i in range(3)]
+    assert {p["id"] for p in profiling.list_profiles()} == set(ids[1:])
+    assert profiling.get_profile(ids[0]) is None
+    assert len(list(profile_dir.iterdir())) == 4
@@ -0,0 +1,198 @@
+import time
+import threading
+
+import pytest
+
+from app.utils import resilience, shared_cache
+from app.utils.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceededError, OverloadedError, RateLimitedError,
+    UpstreamTimeoutError, deadline_scope,
+)
+from fakes import FakeUpstream
+
+
+@pytest.fixture(autouse=True)
+def fresh_upstreams(monkeypatch):
+    monkeypatch.setattr(resilience, "_upstreams", {})
+    monkeypatch.setattr(resilience, "RETRY_BASE_DELAY", 0.01)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for_release(limiter):
+    # Slots are released from the executor's done callback
+    for _ in range(100):
+        if limiter.inflight == 0:
+            return
+        time.sleep(0.01)
+
+
+def test_overload_halves_the_limit():
+    upstream = resilience.get_upstream("model")
+    fake = FakeUpstream(FakeUpstream.quota_exceeded())
+    with pytest.raises(Exception, match="quota"):
+        resilience.call("model", fake)
+    wait_for_release(upstream.limiter)
+    assert fake.calls == 1  # quota errors are not retried
+    assert upstream.limiter.limit == resilience.INITIAL_CONCURRENCY * resilience.DECREASE_FACTOR
+
+
+def test_successes_raise_the_limit_additively():
+    upstream = resilience.get_upstream("model")
+    upstream.limiter.limit = 2.0
+    for _ in range(4):
+        assert resilience.call("model", FakeUpstream()) == "ok"
+    wait_for_release(upstream.limiter)
+    assert 3.0 <= upstream.limiter.limit < 4.0
+
+
+def test_transient_errors_are_retried():
+    upstream = resilience.get_upstream("model")
+    fake = FakeUpstream(ConnectionError("reset by peer"), None)
+    assert resilience.call("model", fake) == "ok"
+    assert fake.calls == 2
+    assert upstream.stats["retries"] == 1
+
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    clock = FakeClock()
+    upstream = resilience.get_upstream("model")
+    upstream.breaker = CircuitBreaker(threshold=2, cooldown=30, clock=clock)
+
+    failing = FakeUpstream(ValueError("bad response"))
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            resilience.call("model", failing, retries=0)
+    assert upstream.breaker.state == "open"
+
+    healthy = FakeUpstream()
+    with pytest.raises(CircuitOpenError):
+        resilience.call("model", healthy)
+    assert healthy.calls == 0
+
+    clock.now += 31
+    assert resilience.call("model", healthy) == "ok"
+    assert upstream.breaker.state == "closed"
+    assert upstream.breaker.trips == 1
+
+
+def test_failed_probe_reopens_the_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=1, cooldown=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_slow_upstream_counts_as_overload(monkeypatch):
+    monkeypatch.setattr(resilience, "UPSTREAM_TIMEOUT", 0.05)
+    upstream = resilience.get_upstream("model")
+    with pytest.raises(UpstreamTimeoutError):
+        resilience.call("model", FakeUpstream(0.3))
+    assert upstream.stats["timeouts"] == 1
+    assert upstream.breaker.failures == 1
+    wait_for_release(upstream.limiter)
+    assert upstream.limiter.limit == resilience.INITIAL_CONCURRENCY * resilience.DECREASE_FACTOR
+
+
+def test_short_client_deadlines_do_not_trip_the_breaker():
+    upstream = resilience.get_upstream("model")
+    for _ in range(resilience.FAILURE_THRESHOLD):
+        with deadline_scope(0.01):
+            with pytest.raises(DeadlineExceededError):
+                resilience.call("model", FakeUpstream(0.05))
+    wait_for_release(upstream.limiter)
+    assert upstream.breaker.state == "closed"
+    assert upstream.breaker.failures == 0
+    assert upstream.limiter.limit >= resilience.INITIAL_CONCURRENCY
+    assert upstream.stats["abandoned"] == resilience.FAILURE_THRESHOLD
+    assert resilience.call("model", FakeUpstream()) == "ok"
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, resilience.DEFAULT_DEADLINE),
+    ("20", 20),
+    ("0.01", resilience.MIN_DEADLINE),
+    ("-5", resilience.MIN_DEADLINE),
+    ("1e9", resilience.DEFAULT_DEADLINE),
+    ("nan", resilience.DEFAULT_DEADLINE),
+    ("inf", resilience.DEFAULT_DEADLINE),
+    ("soon", resilience.DEFAULT_DEADLINE),
+])
+def test_requested_deadline_is_clamped(header, expected):
+    assert resilience.requested_deadline(header) == expected
+
+
+def test_calls_are_shed_when_no_slot_frees_up():
+    upstream = resilience.get_upstream("model")
+    upstream.limiter.limit = 1.0
+    slow = threading.Thread(target=resilience.call, args=("model", FakeUpstream(0.3)))
+    slow.start()
+    time.sleep(0.05)
+
+    fake = FakeUpstream()
+    with deadline_scope(0.05):
+        with pytest.raises(OverloadedError):
+            resilience.call("model", fake)
+    slow.join()
+    assert fake.calls == 0
+    assert upstream.limiter.shed == 1
+
+
+def test_rate_limit_slot_past_deadline_fails_locally():
+    upstream = resilience.get_upstream("model")
+    fake = FakeUpstream()
+    with deadline_scope(1):
+        with pytest.raises(RateLimitedError):
+            resilience.call("model", fake, rate_limit=lambda max_wait: None)
+    assert fake.calls == 0
+    assert upstream.stats["rate_limited"] == 1
+    assert upstream.breaker.failures == 0
+    assert upstream.limiter.inflight == 0
+
+
+def test_rejected_callers_do_not_push_the_rate_limit_horizon_forward():
+    def reserve(max_wait):
+        return shared_cache.reserve_slot("gemini", 2.0, max_wait)
+
+    first = reserve(60)
+    with deadline_scope(1):
+        for _ in range(10):
+            with pytest.raises(RateLimitedError):
+                resilience.call("model", FakeUpstream(), rate_limit=reserve)
+    assert reserve(60) == pytest.approx(first + 2.0)
+
+
+def test_rate_limit_wait_holds_no_concurrency_slot():
+    upstream = resilience.get_upstream("model")
+    seen = []
+
+    def reserve(max_wait):
+        seen.append(upstream.limiter.inflight)
+        return time.time() + 0.05
+
+    assert resilience.call("model", FakeUpstream(), rate_limit=reserve) == "ok"
+    assert seen == [0]
+
+
+def test_wait_for_slot_fails_fast_past_the_deadline():
+    started = time.time()
+    with deadline_scope(1):
+        with pytest.raises(RateLimitedError):
+            resilience.wait_for_slot("embeddings", lambda max_wait: None)
+    assert time.time() - started < 0.5
+    assert resilience.get_upstream("embeddings").stats["rate_limited"] == 1
+
+    with deadline_scope(1):
+        resilience.wait_for_slot("embeddings", lambda max_wait: time.time() + 0.05)
@@ -0,0 +1,123 @@
+import time
+import threading
+
+import pytest
+
+from app.utils import shared_cache
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return shared_cache.SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return shared_cache.RedisBackend(client=fakeredis.FakeRedis())
+
+
+def test_set_get_and_ttl(backend):
+    backend.set("forever", {"a": [1, 2]})
+    backend.set("short", "value", ttl=0.05)
+    assert backend.get("forever") == {"a": [1, 2]}
+    assert backend.get("short") == "value"
+    time.sleep(0.1)
+    assert backend.get("short") is None
+    assert backend.get("forever") == {"a": [1, 2]}
+
+
+def test_incr_is_atomic_across_threads(backend):
+    def bump():
+        for _ in range(50):
+            backend.incr("hits")
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert backend.read_counter("hits") == 200
+    assert backend.read_counter("never_written") == 0
+
+
+def test_reserve_slot_spaces_callers(backend):
+    slots = sorted(backend.reserve_slot("gemini", 0.5) for _ in range(3))
+    assert slots[1] - slots[0] == pytest.approx(0.5, abs=0.01)
+    assert slots[2] - slots[1] == pytest.approx(0.5, abs=0.01)
+
+
+def test_cross_worker_hits_are_counted(backend, monkeypatch):
+    shared_cache.set_backend(backend)
+    monkeypatch.setattr(shared_cache, "WORKER_ID", 1111)
+    shared_cache.cache_set("summary:abc", "written by worker 1111")
+    assert shared_cache.cache_get("summary:abc") == "written by worker 1111"
+
+    monkeypatch.setattr(shared_cache, "WORKER_ID", 2222)
+    assert shared_cache.cache_get("summary:abc") == "written by worker 1111"
+    assert shared_cache.cache_get("summary:missing") is None
+
+    stats = shared_cache.get_cache_stats()
+    assert stats["hits"] == 2
+    assert stats["cross_worker_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_hit_survives_failed_metric_update(memory_cache, monkeypatch):
+    memory_cache.set("key", "value")
+
+    def broken_incr(key, amount=1):
+        raise ConnectionError("backend went away")
+
+    monkeypatch.setattr(memory_cache, "incr", broken_incr)
+    assert shared_cache.cache_get("key") == "value"
+
+
+def test_helpers_fall_back_locally_when_backend_is_down(monkeypatch):
+    class DownBackend(shared_cache.CacheBackend):
+        name = "down"
+
+        def __getattribute__(self, attr):
+            if attr in ("get_entry", "set", "incr", "read_counter", "reserve_slot"):
+                raise ConnectionError("backend went away")
+            return super().__getattribute__(attr)
+
+    shared_cache.set_backend(DownBackend())
+    monkeypatch.setattr(shared_cache, "_local_fallback", shared_cache.MemoryBackend())
+
+    assert shared_cache.incr("requests") == 1
+    assert shared_cache.counter("requests") == 1
+    first = shared_cache.reserve_slot("youtube", 0.5)
+    second = shared_cache.reserve_slot("youtube", 0.5)
+    assert second - first == pytest.approx(0.5, abs=0.01)
+    assert shared_cache.cache_get("anything") is None
+
+
+def test_unreachable_redis_falls_back_to_sqlite(monkeypatch, tmp_path):
+    pytest.importorskip("redis")
+    monkeypatch.setattr(shared_cache, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(shared_cache, "REDIS_URL", "redis://127.0.0.1:1/0")
+    monkeypatch.setattr(shared_cache, "CACHE_DB_PATH", str(tmp_path / "cache.sqlite3"))
+    assert shared_cache._create_backend().name == "sqlite"
+
+
+def test_peek_is_unmetered_and_guarded(memory_cache):
+    memory_cache.set("no_transcript:abc", "Transcripts are disabled")
+    assert shared_cache.cache_peek("no_transcript:abc") == "Transcripts are disabled"
+    assert shared_cache.cache_peek("analysis_etag:missing") is None
+    stats = shared_cache.get_cache_stats()
+    assert stats["hits"] == 0 and stats["misses"] == 0
+
+    class DownBackend(shared_cache.CacheBackend):
+        name = "down"
+
+        def get_entry(self, key):
+            raise ConnectionError("backend went away")
+
+    shared_cache.set_backend(DownBackend())
+    assert shared_cache.cache_peek("gemini_last_request") is None
+
+
+def test_reserve_slot_past_max_wait_claims_nothing(backend):
+    first = backend.reserve_slot("gemini", 1.0)
+    for _ in range(10):
+        assert backend.reserve_slot("gemini", 1.0, max_wait=0.5) is None
+    # Rejected callers did not push the horizon forward
+    assert backend.reserve_slot("gemini", 1.0, max_wait=5) == pytest.approx(first + 1.0)
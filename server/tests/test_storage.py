@@ -0,0 +1,119 @@
+import os
+import time
+
+import pytest
+
+from app.utils import shared_cache, storage
+
+_schedule_gc = storage.schedule_gc  # The fixture stubs it out for the other tests
+
+
+@pytest.fixture(autouse=True)
+def chroma_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "CHROMA_ROOT", str(tmp_path))
+    monkeypatch.setattr(storage, "_entries", {})
+    monkeypatch.setattr(storage, "_in_use", {})
+    monkeypatch.setattr(storage, "_loaded", False)
+    monkeypatch.setattr(storage, "schedule_gc", lambda: None)
+    return tmp_path
+
+
+def _write_index(video_id, size=100):
+    path = storage.index_path(video_id)
+    os.makedirs(path)
+    with open(os.path.join(path, "data"), "w") as f:
+        f.write("x" * size)
+    storage.record_write(video_id)
+    time.sleep(0.01)
+
+
+def test_evicts_least_recently_used_first():
+    for video_id in ("a", "b", "c"):
+        _write_index(video_id)
+    storage.touch("a")
+
+    assert storage.enforce_quota(150) == 2
+    assert sorted(storage._entries) == ["a"]
+    assert not os.path.exists(storage.index_path("b"))
+    assert os.path.exists(storage.index_path("a"))
+
+
+def test_pinned_index_is_kept():
+    _write_index("a")
+    _write_index("b")
+    with storage.using("a"):
+        assert storage.enforce_quota(0) == 1
+    assert os.path.exists(storage.index_path("a"))
+    assert not os.path.exists(storage.index_path("b"))
+
+
+def test_pin_file_from_another_worker_is_respected():
+    _write_index("a")
+    pin = storage._pin_file("a", "99999-other")
+    os.makedirs(os.path.dirname(pin), exist_ok=True)
+    open(pin, "w").close()
+
+    assert storage.enforce_quota(0) == 0
+    assert os.path.exists(storage.index_path("a"))
+
+
+def test_stale_pin_file_is_ignored():
+    _write_index("a")
+    pin = storage._pin_file("a", "99999-dead")
+    os.makedirs(os.path.dirname(pin), exist_ok=True)
+    open(pin, "w").close()
+    old = time.time() - storage.PIN_TTL - 1
+    os.utime(pin, (old, old))
+
+    assert storage.enforce_quota(0) == 1
+    assert not os.path.exists(pin)
+
+
+def test_pins_and_trash_are_not_indexed(chroma_root):
+    _write_index("a")
+    with storage.using("a"):
+        storage._entries.clear()
+        storage._refresh()
+    assert sorted(storage._entries) == ["a"]
+
+
+def test_reads_in_another_worker_count_for_lru():
+    for video_id in ("a", "b"):
+        _write_index(video_id)
+    # Another worker served "a": only the directory mtime changes, not our _entries
+    now = time.time() + 1
+    os.utime(storage.index_path("a"), (now, now))
+
+    assert storage.enforce_quota(150) == 1
+    assert os.path.exists(storage.index_path("a"))
+    assert not os.path.exists(storage.index_path("b"))
+
+
+def test_new_index_from_another_worker_is_picked_up():
+    _write_index("a")
+    os.makedirs(storage.index_path("b"))
+    storage._refresh()
+    assert sorted(storage._entries) == ["a", "b"]
+
+
+def test_stale_chroma_client_is_dropped_after_another_worker_rebuilds(monkeypatch):
+    forgotten = []
+    monkeypatch.setattr(storage, "_client_generations", {})
+    monkeypatch.setattr(storage, "_forget_chroma_client", forgotten.append)
+    _write_index("a")
+    storage.refresh_chroma_client("a")
+    assert forgotten == []
+
+    # Another worker evicted and rebuilt the index
+    shared_cache.cache_set(storage._generation_key("a"), "rebuilt-elsewhere")
+    storage.refresh_chroma_client("a")
+    assert forgotten == [storage.index_path("a")]
+    storage.refresh_chroma_client("a")
+    assert len(forgotten) == 1
+
+
+def test_schedule_gc_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(storage, "GC_ENABLED", False)
+    monkeypatch.setattr(storage, "_gc_thread", None)
+    _schedule_gc()
+    assert storage._gc_thread is None
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from app.utils import transcript
+from app.utils.transcript import TranscriptUnavailable, fetch_transcript
+from fakes import FakeSource
+
+VIDEO_ID = "abcdefghijk"
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(transcript, "MIN_REQUEST_INTERVAL", 0)
+
+
+def test_hedged_first_success_wins():
+    primary = FakeSource(error=RuntimeError("network down"))
+    fallback = FakeSource(result=("fallback text", "en"))
+    result = fetch_transcript(VIDEO_ID, [("primary", primary), ("fallback", fallback)], hedged=True)
+    assert result == ("fallback text", "en")
+    assert primary.calls == fallback.calls == [VIDEO_ID]
+
+
+def test_hedged_slow_loser_is_ignored():
+    slow = FakeSource(result=("slow text", "en"), delay=0.5)
+    fast = FakeSource(result=("fast text", "en"))
+    start = time.time()
+    result = fetch_transcript(VIDEO_ID, [("primary", slow), ("fallback", fast)], hedged=True)
+    assert result == ("fast text", "en")
+    assert time.time() - start < 0.4
+
+
+def test_sequential_stops_at_first_success():
+    primary = FakeSource(result=("primary text", "hi"))
+    fallback = FakeSource(result=("fallback text", "en"))
+    assert fetch_transcript(VIDEO_ID, [("primary", primary), ("fallback", fallback)], hedged=False) == (
+        "primary text", "hi")
+    assert fallback.calls == []
+
+
+def test_negative_cache_written_when_every_failure_is_permanent():
+    sources = [
+        ("primary", FakeSource(error=TranscriptUnavailable("Captions disabled"))),
+        ("fallback", FakeSource(error=TranscriptUnavailable("No manual captions"))),
+    ]
+    with pytest.raises(TranscriptUnavailable):
+        fetch_transcript(VIDEO_ID, sources, hedged=True)
+
+    recovered = FakeSource(result=("text", "en"))
+    with pytest.raises(TranscriptUnavailable):
+        fetch_transcript(VIDEO_ID, [("primary", recovered)])
+    assert recovered.calls == []
+
+
+def test_negative_cache_skipped_when_a_failure_is_transient():
+    sources = [
+        ("primary", FakeSource(error=RuntimeError("timeout"))),
+        ("fallback", FakeSource(error=TranscriptUnavailable("No manual captions"))),
+    ]
+    with pytest.raises(TranscriptUnavailable):
+        fetch_transcript(VIDEO_ID, sources, hedged=True)
+
+    assert fetch_transcript(VIDEO_ID, [("primary", FakeSource(result=("text", "en")))]) == ("text", "en")
+
+
+class _Track:
+    def __init__(self, language_code, is_generated, data=None):
+        self.language_code = language_code
+        self.is_generated = is_generated
+        self.data = data
+
+    def fetch(self):
+        return self.data
+
+
+class _Fetched:
+    """Mimics youtube-transcript-api 1.x FetchedTranscript."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def to_raw_data(self):
+        return self.raw
+
+
+def test_pick_prefers_manual_then_base_language():
+    tracks = [_Track("hi", False), _Track("en-GB", True), _Track("en", False)]
+    assert transcript._pick_transcript(tracks) is tracks[2]
+    assert transcript._pick_transcript([_Track("en-GB", True), _Track("fr", False)]).language_code == "en-GB"
+
+
+def test_fetched_transcript_objects_are_normalized(monkeypatch):
+    raw = [{"text": "hello", "start": 0.0, "duration": 1.0}]
+    monkeypatch.setattr(transcript, "_list_transcripts", lambda vid: [_Track("en-US", False, _Fetched(raw))])
+    assert transcript.get_youtube_transcript(VIDEO_ID) == (raw, "en")